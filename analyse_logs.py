@@ -1,437 +1,1801 @@
+import os
 import re
 import json
-import glob
-import sys
+import tarfile
+import hashlib
+import itertools
+import contextlib
+import argparse
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
-from datetime import datetime
+from datetime import datetime, timezone
+
+import timeline_store
+from timeline_store import EventStore
 
 # Define the updated regex pattern
 line_pattern = r"(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}\.\d{6})\s+(.*)"
-paranthesis_pattern = r"\((.*?)\)"
+line_regex = re.compile(line_pattern)
 
 BASE_PATH = "/hosts/node"
 STDOUT_LOGFILE = "/pubsub-shadow.1000.stdout"
+# written instead of the event logs when the nodes run with -trace
+TRACE_LOGFILE = "/pubsub-shadow.trace.jsonl"
+# written next to them when the nodes run with -summary
+SUMMARY_LOGFILE = "/pubsub-shadow.summary.json"
+# simulation results that are read without being extracted first
+ARCHIVE_SUFFIXES = (".tar.gz", ".tar.zst")
+
+# bump this whenever the parsed events change, so the cached scenarios are
+# parsed again
+PARSER_VERSION = 4
+
+announce_list = [0, 7, 8]
+size_list = [128, 256, 512, 1024, 2048, 4096, 8192]
+num_list = [1, 2, 4, 8, 16, 32, 64]
+malicious_list = [5, 10, 20, 30, 50]
+
+# how the "key: value" pairs inside the parentheses of a log line are turned
+# into an event
+MSG = 0  # (id, ...) -> timestamp
+MSG_TOPIC = 1  # (topic, id, ...) -> (timestamp, topic)
+MSG_IDS_TOPIC = 2  # (topic, ids, ...) -> (timestamp, topic) for every id
+MSG_IDS = 3  # (ids, ...) -> (timestamp, last seen topic) for every id
+NODE_TOPIC = 4  # (topic) -> (timestamp, topic)
+NODE_TOPIC_PEER = 5  # (topic, peer) -> (timestamp, topic, peer)
+NODE_PEER = 6  # (peer, ...) -> (timestamp, peer)
+TOPIC = 7  # (topic, ...) -> no event, only updates the last seen topic
+
+# the positions of the message id(s), the topic and the from/to peer among the
+# pairs of every layout, -1 if the layout has none. The topic of an event is
+# the last seen topic, which is -1 for the layouts that don't record one.
+# (msg position, is an id list, topic position, records the topic, peer position)
+layout_fields = {
+    MSG: (0, False, -1, False, 1),
+    MSG_TOPIC: (1, False, 0, True, 2),
+    MSG_IDS_TOPIC: (1, True, 0, True, 2),
+    MSG_IDS: (0, True, -1, True, 1),
+    NODE_TOPIC: (-1, False, 0, True, -1),
+    NODE_TOPIC_PEER: (-1, False, 0, True, 1),
+    NODE_PEER: (-1, False, -1, False, 0),
+    TOPIC: (-1, False, 0, False, -1),
+}
+
+# the text before " (" of a log line identifies its event. Lines with an
+# unknown tag, e.g. the bootstrap messages of main.go, are skipped.
+line_tags = {
+    "GossipSub: Duplicated": ("duplicate", MSG),
+    "Received:": ("received", MSG_TOPIC),
+    "Published:": ("published", MSG_TOPIC),
+    "GossipSub: Rejected": ("rejected", MSG),
+    "GossipSub: Delivered": ("delivered", MSG),
+    "GossipSub: Undeliverable": ("undelivered", MSG),
+    "GossipSub: Validated": ("validated", MSG),
+    "GossipSub: Grafted": ("grafted", NODE_TOPIC_PEER),
+    "GossipSub: Pruned": ("pruned", NODE_TOPIC_PEER),
+    "GossipSub: Joined": ("joined", NODE_TOPIC),
+    "GossipSub: Left": ("left", NODE_TOPIC),
+    "GossipSub: Peer Removed": ("removed", NODE_PEER),
+    "GossipSub: Peer Added": ("added", NODE_PEER),
+    "GossipSub: Throttled": ("throttled", NODE_PEER),
+    "GossipSubRPC: Received Publish": ("rpcs_received", MSG_TOPIC),
+    "GossipSubRPC: Sent Publish": ("rpcs_sent", MSG_TOPIC),
+    "GossipSubRPC: Dropped Publish": (None, TOPIC),
+    "GossipSubRPC: Received IHAVE": ("ihaves_received", MSG_IDS_TOPIC),
+    "GossipSubRPC: Sent IHAVE": ("ihaves_sent", MSG_IDS_TOPIC),
+    "GossipSubRPC: Received IWANT": ("iwants_received", MSG_IDS),
+    "GossipSubRPC: Sent IWANT": ("iwants_sent", MSG_IDS),
+    "GossipSubRPC: Received IDONTWANT": ("idontwants_received", MSG_IDS),
+    "GossipSubRPC: Sent IDONTWANT": ("idontwants_sent", MSG_IDS),
+    "GossipSubRPC: Received INEED": ("ineeds_received", MSG),
+    "GossipSubRPC: Sent INEED": ("ineeds_sent", MSG),
+    "GossipSubRPC: Received IANNOUNCE": ("iannounces_received", MSG_TOPIC),
+    "GossipSubRPC: Sent IANNOUNCE": ("iannounces_sent", MSG_TOPIC),
+}
+
+# the events of the structured trace written by tracer.go are named after the
+# timelines they belong to
+trace_layouts = {kind: layout for kind, layout in line_tags.values() if kind}
+trace_layouts["rpcs_dropped"] = TOPIC
+# the node's own peer id, a "PeerId: <id>" line in the text logs
+trace_layouts["identity"] = NODE_PEER
+IDENTITY_PREFIX = "PeerId: "
+
+
+def timestamp_decoder():
+    second_starts = {}
+
+    # the logs are written with a fixed "YYYY/MM/DD HH:MM:SS.ffffff" layout and
+    # many lines share the same second, so only the first line of every second
+    # goes through datetime. The times are decoded in UTC, like the unix times
+    # of the traces and the summaries, whatever the timezone of the analysis.
+    def decode(log_date_time):
+        prefix = log_date_time[:19]
+        second_start = second_starts.get(prefix)
+        if second_start is None:
+            second_start = int(
+                datetime.strptime(prefix, "%Y/%m/%d %H:%M:%S")
+                .replace(tzinfo=timezone.utc)
+                .timestamp()
+            )
+            second_starts[prefix] = second_start
+        return second_start + int(log_date_time[20:26]) / 1e6
+
+    return decode
+
+
+def node_event_writer(store, node_id):
+    # returns the events of the node by kind, lists the readers append
+    # (timestamp, msg, peer, topic) tuples to, msg_index(msg_id) that interns
+    # a message id and records the first time the node sees it, the messages
+    # the node has seen so far (to skip the call for them) and flush() that
+    # moves the appended events to the columns of the store. One tuple per
+    # event is much cheaper than one append per column, and the columns are
+    # filled a whole read at a time.
+    node = store.add_node(node_id)
+    intern = store.intern
+    index_node = store.index["node"].append
+    index_msg = store.index["msg"].append
+    node_msgs = {}
+    pending = {kind: [] for kind in store.events}
+
+    def msg_index(msg_id):
+        msg = node_msgs.get(msg_id)
+        if msg is None:
+            msg = node_msgs[msg_id] = intern("msgs", msg_id)
+            index_node(node)
+            index_msg(msg)
+        return msg
+
+    def flush():
+        for kind, events in pending.items():
+            if not events:
+                continue
+            cols = store.events[kind]
+            times, msgs, peers, topics = zip(*events)
+            cols["time"].extend(times)
+            cols["node"].extend(itertools.repeat(node, len(events)))
+            cols["msg"].extend(msgs)
+            cols["peer"].extend(peers)
+            cols["topic"].extend(topics)
+            events.clear()
 
+    return pending, msg_index, node_msgs, flush
 
-def extract_data(log_line):
-    info_match = re.search(paranthesis_pattern, log_line)
-    values = []
-    if info_match:
-        pairs = (info_match.group(1)).split(", ")
-        for item in pairs:
-            value = item.split(": ")[1]
-            if "[" in value:
-                matches = re.findall(r'"([^"]+)"', value)
-                values.append(matches)
+
+def read_node_logs(lines, store=None, node_id="0"):
+    if store is None:
+        store = EventStore()
+    node_log_reader(store, node_id)(lines)
+    return store
+
+
+def node_log_reader(store, node_id):
+    # returns read(lines) that parses lines of the node's log into the store.
+    # It can be called again with the lines written since, e.g. while the
+    # simulation is still running, as long as every line is complete.
+    pending, msg_index, node_msgs, flush = node_event_writer(store, node_id)
+    intern = store.intern
+    peer_ids = store.ids("peers")
+    topic_ids = store.ids("topics")
+    get_msg = node_msgs.get
+
+    # the tag table resolved to the event lists of the node, so that the loop
+    # below appends every event without any further lookups
+    tags = {}
+    for tag, (kind, layout) in line_tags.items():
+        add = pending[kind].append if kind is not None else None
+        tags[tag] = (add, *layout_fields[layout])
+    add_identity = pending["identity"].append
+
+    decode_timestamp = timestamp_decoder()
+    match_line = line_regex.match
+    get_tag = tags.get
+    # the decoded timestamp of the previous line, most lines share it
+    last_time = ["", 0.0]
+    # the last seen topic, kept from one read to the next
+    last_topic = [-1]
+
+    def read(lines):
+        topic = last_topic[0]
+        date_time, timestamp = last_time
+        for line in lines:
+            # the timestamp has a fixed width and main.go writes one space
+            # after it, so the regex is only needed for the other lines. The
+            # tag is the text before " (" after the timestamp.
+            if line[19:28:7] == ". " and line[27:28] != " ":
+                head, paren, rest = line.partition(" (")
+                head = head[27:]
+                if line[:26] != date_time:
+                    date_time = line[:26]
+                    timestamp = decode_timestamp(date_time)
             else:
-                values.append(value)
-    else:
-        raise Exception("couldn't extract content for log_line" + log_line)
+                match = match_line(line.strip())
+                if match is None:
+                    raise Exception("Couldn't match pattern for timestamps")
+                head, paren, rest = match.group(2).partition(" (")
+                if match.group(1) != date_time:
+                    date_time = match.group(1)
+                    timestamp = decode_timestamp(date_time)
 
-    return values
+            if not paren:
+                if head.startswith(IDENTITY_PREFIX):
+                    peer_id = head[len(IDENTITY_PREFIX) :].strip()
+                    add_identity((timestamp, -1, intern("peers", peer_id), -1))
+                continue
+            tag = get_tag(head)
+            if tag is None:
+                continue
 
+            pairs, close, _ = rest.partition(")")
+            if not close:
+                raise Exception("couldn't extract content for log_line" + head + rest)
+            # the "key: value" pairs inside the parentheses
+            items = pairs.split(", ")
 
-def read_node_logs(lines):
-    timelines = {
-        "added": [],
-        "removed": [],
-        "throttled": [],
-        "joined": [],
-        "left": [],
-        "grafted": [],
-        "pruned": [],
-        "msgs": {},
-    }
+            add, msg_at, is_list, topic_at, keeps_topic, peer_at = tag
+            if topic_at >= 0:
+                topic_id = items[topic_at].partition(": ")[2]
+                topic = topic_ids.get(topic_id)
+                if topic is None:
+                    topic = intern("topics", topic_id)
+            if add is None:
+                continue
 
-    def add_timestamp(msg_id, key, timestamp):
-        if msg_id is None:
-            timelines[key].append(timestamp)
-            return
-
-        msg_id = msg_id.replace('"', "")
-
-        if msg_id not in timelines["msgs"]:
-            timelines["msgs"][msg_id] = {
-                "validated": [],
-                "delivered": [],
-                "rejected": [],
-                "received": [],
-                "published": [],
-                "duplicate": [],
-                "undelivered": [],
-                "idontwants_sent": [],
-                "idontwants_received": [],
-                "ihaves_sent": [],
-                "ihaves_received": [],
-                "iwants_sent": [],
-                "iwants_received": [],
-                "iannounces_sent": [],
-                "iannounces_received": [],
-                "ineeds_sent": [],
-                "ineeds_received": [],
-                # these are publish messages of the rpc
-                "rpcs_sent": [],
-                "rpcs_received": [],
-            }
+            peer = -1
+            if 0 <= peer_at < len(items):
+                peer_id = items[peer_at].partition(": ")[2]
+                peer = peer_ids.get(peer_id)
+                if peer is None:
+                    peer = intern("peers", peer_id)
 
-        timelines["msgs"][msg_id][key].append(timestamp)
-
-    for line in lines:
-        match = re.match(line_pattern, line.strip())
-        if match:
-            log_date_time = match.group(1)  # Date (YYYY/MM/DD)
-            log_content = match.group(2)  # Log content
-
-            timestamp = datetime.strptime(
-                log_date_time, "%Y/%m/%d %H:%M:%S.%f"
-            ).timestamp()
-
-            if "GossipSub: Duplicated" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[0]
-                add_timestamp(msg_id, "duplicate", (timestamp))
-            elif "Received:" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[1]
-                topic = ext[0]
-                add_timestamp(msg_id, "received", (timestamp, topic))
-            elif "Published:" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[1]
-                topic = ext[0]
-                add_timestamp(msg_id, "published", (timestamp, topic))
-            elif "GossipSub: Rejected" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[0]
-                add_timestamp(msg_id, "rejected", (timestamp))
-            elif "GossipSub: Delivered" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[0]
-                add_timestamp(msg_id, "delivered", (timestamp))
-            elif "GossipSub: Undeliverable" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[0]
-                add_timestamp(msg_id, "undelivered", (timestamp))
-            elif "GossipSub: Validated" in log_content:
-                ext = extract_data(log_content)
-                msg_id = ext[0]
-                add_timestamp(msg_id, "validated", (timestamp))
-            elif "GossipSub: Grafted" in log_content:
-                ext = extract_data(log_content)
-                peer_id = ext[1]
-                topic = ext[0]
-                add_timestamp(None, "grafted", (timestamp, topic, peer_id))
-            elif "GossipSub: Pruned" in log_content:
-                ext = extract_data(log_content)
-                peer_id = ext[1]
-                topic = ext[0]
-                add_timestamp(None, "pruned", (timestamp, topic, peer_id))
-            elif "GossipSub: Joined" in log_content:
-                ext = extract_data(log_content)
-                topic = ext[0]
-                add_timestamp(None, "joined", (timestamp, topic))
-            elif "GossipSub: Left" in log_content:
-                ext = extract_data(log_content)
-                topic = ext[0]
-                add_timestamp(None, "left", (timestamp, topic))
-            elif "GossipSub: Peer Removed" in log_content:
-                ext = extract_data(log_content)
-                peer_id = ext[0]
-                add_timestamp(None, "removed", (timestamp, peer_id))
-            elif "GossipSub: Peer Added" in log_content:
-                ext = extract_data(log_content)
-                peer_id = ext[0]
-                add_timestamp(None, "added", (timestamp, topic))
-            elif "GossipSub: Throttled" in log_content:
-                ext = extract_data(log_content)
-                peer_id = ext[0]
-                add_timestamp(None, "throttled", (timestamp, peer_id))
-            elif "GossipSubRPC:" in log_content:
-                ext = extract_data(log_content)
-                if "Publish" in log_content:
-                    msg_id = ext[1]
-                    topic = ext[0]
-                    if "Received" in log_content:
-                        add_timestamp(msg_id, "rpcs_received", (timestamp, topic))
-                    elif "Sent" in log_content:
-                        add_timestamp(msg_id, "rpcs_sent", (timestamp, topic))
-                elif "IHAVE" in log_content:
-                    topic = ext[0]
-                    if "Received" in log_content:
-                        for msg_id in ext[1]:
-                            add_timestamp(msg_id, "ihaves_received", (timestamp, topic))
-                    elif "Sent" in log_content:
-                        for msg_id in ext[1]:
-                            add_timestamp(msg_id, "ihaves_sent", (timestamp, topic))
-                elif "IWANT" in log_content:
-                    if "Received" in log_content:
-                        for msg_id in ext[0]:
-                            add_timestamp(msg_id, "iwants_received", (timestamp, topic))
-                    elif "Sent" in log_content:
-                        for msg_id in ext[0]:
-                            add_timestamp(msg_id, "iwants_sent", (timestamp, topic))
-                elif "IDONTWANT" in log_content:
-                    if "Received" in log_content:
-                        for msg_id in ext[0]:
-                            add_timestamp(
-                                msg_id, "idontwants_received", (timestamp, topic)
-                            )
-                    elif "Sent" in log_content:
-                        for msg_id in ext[0]:
-                            add_timestamp(msg_id, "idontwants_sent", (timestamp, topic))
-                elif "INEED" in log_content:
-                    msg_id = ext[0]
-                    if "Received" in log_content:
-                        add_timestamp(msg_id, "ineeds_received", (timestamp))
-                    elif "Sent" in log_content:
-                        add_timestamp(msg_id, "ineeds_sent", (timestamp))
-                elif "IANNOUNCE" in log_content:
-                    msg_id = ext[1]
-                    topic = ext[0]
-                    if "Received" in log_content:
-                        add_timestamp(msg_id, "iannounces_received", (timestamp, topic))
-                    elif "Sent" in log_content:
-                        add_timestamp(msg_id, "iannounces_sent", (timestamp, topic))
-        else:
-            raise Exception("Couldn't match pattern for timestamps")
+            event_topic = topic if keeps_topic else -1
+            if msg_at < 0:
+                add((timestamp, -1, peer, event_topic))
+            elif is_list:
+                # %q formatted ids look like ids: ["id1" "id2"]
+                for msg_id in items[msg_at].split('"')[1::2]:
+                    msg = get_msg(msg_id)
+                    if msg is None:
+                        msg = msg_index(msg_id)
+                    add((timestamp, msg, peer, event_topic))
+            else:
+                msg_id = items[msg_at].partition(": ")[2].replace('"', "")
+                msg = get_msg(msg_id)
+                if msg is None:
+                    msg = msg_index(msg_id)
+                add((timestamp, msg, peer, event_topic))
+        last_topic[0] = topic
+        last_time[:] = date_time, timestamp
+        flush()
+
+    return read
+
+
+def read_node_trace(lines, store=None, node_id="0"):
+    if store is None:
+        store = EventStore()
+    node_trace_reader(store, node_id)(lines)
+    return store
+
+
+def node_trace_reader(store, node_id):
+    # returns read(lines) that parses lines of the node's trace into the
+    # store, like node_log_reader
+    pending, msg_index, _, flush = node_event_writer(store, node_id)
+    # the trace's own table indices mapped to the ones of the store
+    tables = {"peer": [], "msg": [], "topic": []}
+    last_topic = [-1]
 
-    return timelines
+    def read(lines):
+        topic = last_topic[0]
+        for line in lines:
+            record = json.loads(line)
+            if isinstance(record[0], str):
+                # definitions are written in index order
+                table, _, value = record
+                if table == "msg":
+                    tables[table].append(value)
+                else:
+                    tables[table].append(store.intern(table + "s", value))
+                continue
+
+            time_ns, kind, peer, msg, topic_idx = record
+            layout = trace_layouts.get(kind)
+            if layout is None:
+                continue
+
+            # the trace has the simulated unix time in nanoseconds, this is the
+            # same float as the microsecond text timestamp, which is in UTC too
+            timestamp = time_ns // 1_000_000_000 + (time_ns // 1000 % 1_000_000) / 1e6
+
+            msg_at, _, topic_at, keeps_topic, _ = layout_fields[layout]
+            if topic_at >= 0:
+                topic = tables["topic"][topic_idx]
+            if layout == TOPIC:
+                continue
+
+            msg = msg_index(tables["msg"][msg]) if msg_at >= 0 else -1
+            peer = tables["peer"][peer] if peer >= 0 else -1
+            pending[kind].append((timestamp, msg, peer, topic if keeps_topic else -1))
+        last_topic[0] = topic
+        flush()
+
+    return read
+
+
+def read_node_file(folder, id, store=None):
+    trace = folder + BASE_PATH + str(id) + TRACE_LOGFILE
+    if os.path.exists(trace):
+        with open(trace, "r", encoding="utf-8") as f:
+            return read_node_trace(f, store, str(id))
+
+    with open(
+        folder + BASE_PATH + str(id) + STDOUT_LOGFILE,
+        "r",
+        encoding="utf-8",
+        errors="replace",
+    ) as f:
+        return read_node_logs(f, store, str(id))
 
 
 def extract_node_timelines(folder, count):
-    extracted_data = {}
+    store = EventStore()
     for id in range(count):
-        with open(
-            folder + BASE_PATH + str(id) + STDOUT_LOGFILE,
-            "r",
-            encoding="utf-8",
-            errors="replace",
-        ) as f:
-            logs = f.readlines()
-            extracted_data[str(id)] = read_node_logs(logs)
+        read_node_file(folder, id, store)
+
+    return store
+
+
+def is_archive(source):
+    return source.endswith(ARCHIVE_SUFFIXES)
+
+
+@contextlib.contextmanager
+def open_archive(path):
+    with open(path, "rb") as f:
+        stream = f
+        if path.endswith(".tar.zst"):
+            try:
+                import zstandard
+            except ImportError:
+                raise Exception(
+                    "the zstandard package is needed to read " + path
+                ) from None
+            stream = zstandard.ZstdDecompressor().stream_reader(f)
+
+        # "r|*" reads the archive as a forward-only stream, so every member is
+        # decompressed exactly once and nothing is written to disk
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            yield tar
+
+
+def extract_archive_timelines(path, count):
+    member_pattern = re.compile(
+        re.escape(BASE_PATH)
+        + r"(\d+)("
+        + re.escape(STDOUT_LOGFILE)
+        + "|"
+        + re.escape(TRACE_LOGFILE)
+        + ")$"
+    )
+
+    nodes = {}
+    traced = set()
+    with open_archive(path) as tar:
+        for member in tar:
+            match = member_pattern.search(member.name)
+            if not match or not member.isfile():
+                continue
+            id = int(match.group(1))
+            if id >= count or id in traced:
+                continue
+            # the member is decoded line by line while it is being inflated
+            f = tar.extractfile(member)
+            lines = (line.decode("utf-8", errors="replace") for line in f)
+            if match.group(2) == TRACE_LOGFILE:
+                # the trace has the events, the stdout only has the bootstrap
+                nodes[id] = read_node_trace(lines, node_id=str(id))
+                traced.add(id)
+            else:
+                nodes[id] = read_node_logs(lines, node_id=str(id))
+
+    # the members are not necessarily in node order
+    store = EventStore()
+    for id in range(count):
+        if id not in nodes:
+            raise Exception(f"couldn't find the logs of node{id} in {path}")
+        store.extend(nodes.pop(id))
+
+    return store
+
+
+def scenario_source(key):
+    folder = f"shadow-{key}.data"
+    if os.path.isdir(folder):
+        return folder
+    for suffix in ARCHIVE_SUFFIXES:
+        if os.path.exists(f"shadow-{key}{suffix}"):
+            return f"shadow-{key}{suffix}"
+    return folder
+
+
+def extract_scenario_timelines(source, count):
+    if is_archive(source):
+        return extract_archive_timelines(source, count)
+    return extract_node_timelines(source, count)
+
+
+def read_summaries(source, count):
+    # the summaries the nodes wrote with -summary, in node order
+    summaries = {}
+    if is_archive(source):
+        member_pattern = re.compile(
+            re.escape(BASE_PATH) + r"(\d+)" + re.escape(SUMMARY_LOGFILE) + "$"
+        )
+        with open_archive(source) as tar:
+            for member in tar:
+                match = member_pattern.search(member.name)
+                if match and member.isfile() and int(match.group(1)) < count:
+                    summaries[int(match.group(1))] = json.load(tar.extractfile(member))
+    else:
+        for id in range(count):
+            path = source + BASE_PATH + str(id) + SUMMARY_LOGFILE
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    summaries[id] = json.load(f)
+
+    for id in range(count):
+        if id not in summaries:
+            raise Exception(f"couldn't find the summary of node{id} in {source}")
+    return [summaries[id] for id in range(count)]
+
 
-    return extracted_data
+def load_summaries(keys, count):
+    # the summaries are small enough that they aren't cached
+    return {key: read_summaries(scenario_source(key), count) for key in keys}
+
+
+def scenario_params(key):
+    # the message size in bytes, Dannounce, number of messages, percent of
+    # malicious nodes and heartbeat interval in seconds of a scenario, as set
+    # by run_sim.sh
+    parts = key.split("-")
+    if parts[0] == "malicious":
+        params = {
+            "msg_size": 128 * 1024,
+            "announce": int(parts[2]),
+            "num_msgs": 16,
+            "malicious": int(parts[1]),
+        }
+    else:
+        params = {
+            "msg_size": int(parts[0]) * 1024,
+            "announce": int(parts[1]),
+            "num_msgs": int(parts[2]),
+            "malicious": 0,
+        }
+    params["interval"] = 0.7 if params["announce"] == 0 else 1.5
+    return params
+
+
+def scenario_keys():
+    keys = []
+    for announce in announce_list:
+        for msg_size in size_list:
+            keys.append(f"{msg_size}-{announce}-1")
+    for announce in announce_list:
+        for num_msgs in num_list:
+            key = f"128-{announce}-{num_msgs}"
+            # the single 128KB message run is shared with the sizes sweep
+            if key not in keys:
+                keys.append(key)
+    for announce in announce_list:
+        for malicious in malicious_list:
+            keys.append(f"malicious-{malicious}-{announce}")
+    return keys
+
+
+def _read_task(task):
+    source, id, count = task
+    if id is None:
+        return extract_archive_timelines(source, count)
+    return read_node_file(source, id)
+
+
+def iter_scenario_timelines(keys, count, jobs=1):
+    # yields (key, store) as soon as every node of a scenario has been parsed
+    if jobs <= 1:
+        for key in keys:
+            print(key)
+            yield key, extract_scenario_timelines(scenario_source(key), count)
+        return
+
+    # fan out one task per (scenario, node) so that every core stays busy even
+    # when a scenario has only a few large logs. Results stream back one node
+    # at a time in submission order as compact event stores, so the parent
+    # merges each node's events as soon as they are ready instead of receiving
+    # a whole scenario at the end, and the nodes end up in the same order as
+    # in the serial path.
+    # An archive can only be read front to back, so it is a single task.
+    tasks = []
+    for key in keys:
+        source = scenario_source(key)
+        if is_archive(source):
+            tasks.append((key, (source, None, count)))
+        else:
+            tasks.extend((key, (source, id, count)) for id in range(count))
+
+    chunksize = max(1, min(16, len(tasks) // (jobs * 8)))
+    with multiprocessing.Pool(jobs) as pool:
+        results = pool.imap(_read_task, [task for _, task in tasks], chunksize)
+        for (key, (_, id, _)), result in zip(tasks, results):
+            if id is None:
+                print(key)
+                yield key, result
+                continue
+            if id == 0:
+                print(key)
+                store = EventStore()
+            store.extend(result)
+            if id == count - 1:
+                yield key, store
+
+
+def extract_all_timelines(keys, count, jobs=1):
+    return dict(iter_scenario_timelines(keys, count, jobs))
+
+
+def source_fingerprint(source, count, use_hash=False):
+    # identifies the logs a scenario was parsed from, None if they are gone
+    if is_archive(source):
+        paths = [source]
+    else:
+        paths = []
+        for id in range(count):
+            for logfile in [STDOUT_LOGFILE, TRACE_LOGFILE]:
+                paths.append(source + BASE_PATH + str(id) + logfile)
+        paths = [path for path in paths if os.path.exists(path)]
+    if len(paths) == 0:
+        return None
+
+    fingerprint = hashlib.sha256(f"{PARSER_VERSION} {count}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.update(f"{path} {stat.st_size} {stat.st_mtime_ns}".encode())
+        if use_hash:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    fingerprint.update(chunk)
+    return fingerprint.hexdigest()
+
+
+def load_timelines(keys, count, cache, jobs=1, reparse=False, use_hash=False):
+    # loads every scenario from the cache and parses only the ones whose logs
+    # changed since they were cached, or that were never cached
+    timelines = {}
+    fingerprints = {}
+    stale = []
+    for key in keys:
+        path = os.path.join(cache, key)
+        fingerprint = source_fingerprint(scenario_source(key), count, use_hash)
+        cached = timeline_store.scenario_fingerprint(path)
+        if fingerprint is None and cached is None:
+            raise Exception(f"couldn't find the logs of {key}")
+
+        if not reparse and cached is not None and fingerprint in (None, cached):
+            timelines[key] = timeline_store.load_scenario(path)
+        else:
+            fingerprints[key] = fingerprint
+            stale.append(key)
+
+    print(f"{len(keys) - len(stale)} scenarios are cached, parsing {len(stale)}")
+    for key, store in iter_scenario_timelines(stale, count, jobs):
+        path = os.path.join(cache, key)
+        timeline_store.write_scenario(path, store, fingerprints[key])
+        timelines[key] = store
+
+    # keep the order of the keys
+    return {key: timelines[key] for key in keys}
+
+
+def as_event_store(extracted_data):
+    # the events of a scenario, also when it was loaded from the timelines
+    # of an older version
+    if isinstance(extracted_data, EventStore):
+        return extracted_data
+    return EventStore.from_timelines(extracted_data)
+
+
+def store_delivery_matrix(store):
+    nodes = list(store.nodes)
+    shape = (len(nodes), len(store.strings["msgs"]))
+
+    seen = np.zeros(shape, dtype=bool)
+    seen[store.index_column("node"), store.index_column("msg")] = True
+
+    delivered = np.full(shape, np.inf)
+    np.minimum.at(
+        delivered,
+        (store.column("delivered", "node"), store.column("delivered", "msg")),
+        store.column("delivered", "time"),
+    )
+    delivered[np.isinf(delivered)] = np.nan
+
+    duplicates = np.zeros(shape, dtype=np.int64)
+    np.add.at(
+        duplicates,
+        (store.column("duplicate", "node"), store.column("duplicate", "msg")),
+        1,
+    )
+
+    # we know node 0 is the publisher, every message is published only once
+    # so the first publish event of a message is its publishing time
+    published = np.full(shape[1], np.nan)
+    is_publisher = store.column("published", "node") == nodes.index("0")
+    msgs = store.column("published", "msg")[is_publisher]
+    times = store.column("published", "time")[is_publisher]
+    published[msgs[::-1]] = times[::-1]
+
+    return {
+        "nodes": nodes,
+        "msgs": list(store.strings["msgs"]),
+        "seen": seen,
+        "delivered": delivered,
+        "duplicates": duplicates,
+        "published": published,
+    }
+
+
+def summary_delivery_matrix(summaries):
+    nodes = [str(summary["node"]) for summary in summaries]
+    msg_index = {}
+    for summary in summaries:
+        for field in ["published", "delivered", "duplicates"]:
+            for msg_id in summary[field]:
+                msg_index.setdefault(msg_id, len(msg_index))
+
+    shape = (len(nodes), len(msg_index))
+    seen = np.zeros(shape, dtype=bool)
+    delivered = np.full(shape, np.nan)
+    duplicates = np.zeros(shape, dtype=np.int64)
+    published = np.full(shape[1], np.nan)
+    for row, summary in enumerate(summaries):
+        for msg_id, ns in summary["delivered"].items():
+            seen[row, msg_index[msg_id]] = True
+            delivered[row, msg_index[msg_id]] = ns / 1e9
+        for msg_id, dups in summary["duplicates"].items():
+            seen[row, msg_index[msg_id]] = True
+            duplicates[row, msg_index[msg_id]] = dups
+        for msg_id, ns in summary["published"].items():
+            seen[row, msg_index[msg_id]] = True
+            # we know node 0 is the publisher
+            if summary["node"] == 0:
+                published[msg_index[msg_id]] = ns / 1e9
+
+    return {
+        "nodes": nodes,
+        "msgs": list(msg_index),
+        "seen": seen,
+        "delivered": delivered,
+        "duplicates": duplicates,
+        "published": published,
+    }
+
+
+def delivery_matrix(extracted_data):
+    if isinstance(extracted_data, EventStore):
+        return store_delivery_matrix(extracted_data)
+    if isinstance(extracted_data, list):
+        return summary_delivery_matrix(extracted_data)
+
+    nodes = list(extracted_data)
+    msg_index = {}
+    # (node row, msg column, first delivery, duplicates) of every message a
+    # node has any event for
+    rows, cols, firsts, dups = [], [], [], []
+
+    for row, id in enumerate(nodes):
+        for msg_id, events in extracted_data[id]["msgs"].items():
+            col = msg_index.setdefault(msg_id, len(msg_index))
+            delivered = events["delivered"]
+            rows.append(row)
+            cols.append(col)
+            firsts.append(min(delivered) if delivered else np.nan)
+            dups.append(len(events["duplicate"]))
+
+    shape = (len(nodes), len(msg_index))
+    seen = np.zeros(shape, dtype=bool)
+    seen[rows, cols] = True
+    delivered = np.full(shape, np.nan)
+    delivered[rows, cols] = firsts
+    duplicates = np.zeros(shape, dtype=np.int64)
+    duplicates[rows, cols] = dups
+
+    # we know node 0 is the publisher
+    published = np.full(len(msg_index), np.nan)
+    for msg_id, events in extracted_data["0"]["msgs"].items():
+        if len(events["published"]) > 0:
+            # since every message is published only once we don't need to sort
+            published[msg_index[msg_id]] = events["published"][0][0]
+
+    return {
+        "nodes": nodes,
+        "msgs": list(msg_index),
+        "seen": seen,
+        "delivered": delivered,
+        "duplicates": duplicates,
+        "published": published,
+    }
+
+
+def analyse_deliveries(deliveries, shouldhave):
+    # A message that a node never delivered is NaN in "delivered" and so in
+    # "delays". It counts towards "lost", and it is left out of the node's f2l
+    # and l2f. A node that delivered nothing has NaN f2l and l2f.
+    delivered = deliveries["delivered"]
+    published = deliveries["published"]
+    has_delivery = ~np.isnan(delivered)
+    any_delivery = has_delivery.any(axis=1)
+
+    if np.isnan(published).all():
+        first_publish = last_publish = 0.0
+    else:
+        first_publish = np.nanmin(published)
+        last_publish = np.nanmax(published)
+
+    first_receive = np.full(len(delivered), np.nan)
+    last_receive = np.full(len(delivered), np.nan)
+    first_receive[any_delivery] = delivered[any_delivery].min(
+        axis=1, initial=np.inf, where=has_delivery[any_delivery]
+    )
+    last_receive[any_delivery] = delivered[any_delivery].max(
+        axis=1, initial=-np.inf, where=has_delivery[any_delivery]
+    )
+
+    return {
+        "delays": delivered - published,
+        "f2l": last_receive - first_publish,
+        "l2f": first_receive - last_publish,
+        "lost": shouldhave - has_delivery.sum(axis=1),
+        "duplicates": deliveries["duplicates"].sum(axis=1),
+    }
 
 
 def analyse_timelines(extracted_data, shouldhave):
+    deliveries = delivery_matrix(extracted_data)
+    analysis = analyse_deliveries(deliveries, shouldhave)
+
+    nodes = np.array(deliveries["nodes"], dtype=object)
     arrival_times = {}
-    rx_msgs = []
-    dup_msgs = []
+    # one entry for every node that has seen the message, NaN if the node
+    # never delivered it
+    for col, msg_id in enumerate(deliveries["msgs"]):
+        rows = np.flatnonzero(deliveries["seen"][:, col])
+        arrival_times[msg_id] = list(
+            zip(nodes[rows].tolist(), analysis["delays"][rows, col].tolist())
+        )
 
-    # we know node 0 is the publiisher
-    timeline = extracted_data["0"]["msgs"]
+    received = ~np.isnan(analysis["f2l"])
+    arrival_times["f2l"] = list(
+        zip(nodes[received].tolist(), analysis["f2l"][received].tolist())
+    )
+    arrival_times["l2f"] = list(
+        zip(nodes[received].tolist(), analysis["l2f"][received].tolist())
+    )
 
-    publishing_times = {}
-    first_publish = 0
-    last_publish = 0
-    for msg_id in timeline:
-        if len(timeline[msg_id]["published"]) > 0:
-            # since every messaage is published only once we don't need to sort
-            publishing_times[msg_id] = (timeline[msg_id]["published"][0])[0]
+    return arrival_times, analysis["lost"].tolist(), analysis["duplicates"].tolist()
 
-            if first_publish == 0 or publishing_times[msg_id] < first_publish:
-                first_publish = publishing_times[msg_id]
 
-            if publishing_times[msg_id] > last_publish:
-                last_publish = publishing_times[msg_id]
-        else:
-            pass
+# the events counted for every type of control message, one per message id
+control_kinds = {
+    "IHAVE": ("ihaves_sent", "ihaves_received"),
+    "IWANT": ("iwants_sent", "iwants_received"),
+    "IDONTWANT": ("idontwants_sent", "idontwants_received"),
+    "IANNOUNCE": ("iannounces_sent", "iannounces_received"),
+    "INEED": ("ineeds_sent", "ineeds_received"),
+}
 
-    for id in extracted_data:
-        timeline = extracted_data[id]["msgs"]
 
-        dups = 0
-        received = 0
+def analyse_bandwidth(extracted_data, msg_size, num_msgs):
+    # Every message sent or received in an RPC carries msg_size bytes of
+    # payload. The amplification is the payload sent over the payload that
+    # delivering every message once to every node takes, so 1 is the best
+    # there is. The summaries of the nodes also have the bytes of their RPCs
+    # on the wire, control included, which the logs don't.
+    wire_sent = wire_received = None
+    if isinstance(extracted_data, list):
+        nodes = [str(summary["node"]) for summary in extracted_data]
+        counts = {}
+        for direction in ["sent", "received"]:
+            counts[f"rpcs_{direction}"] = np.array(
+                [summary[f"rpcs_{direction}"] for summary in extracted_data]
+            )
+        for name, (sent, received) in control_kinds.items():
+            counts[sent] = np.array(
+                [summary["control_sent"].get(name, 0) for summary in extracted_data]
+            )
+            counts[received] = np.array(
+                [summary["control_received"].get(name, 0) for summary in extracted_data]
+            )
+        per_node = counts.__getitem__
+        wire_sent = np.array([summary["bytes_sent"] for summary in extracted_data])
+        wire_received = np.array(
+            [summary["bytes_received"] for summary in extracted_data]
+        )
+    else:
+        store = as_event_store(extracted_data)
+        nodes = list(store.nodes)
 
-        rx_times = {}
-        first_receive = 0.0
-        last_receive = 0.0
+        def per_node(kind):
+            return np.bincount(store.column(kind, "node"), minlength=len(nodes))
 
-        for msg_id in timeline:
-            if len(timeline[msg_id]["delivered"]) > 0:
-                # the first time we received a particular msg_id
-                rx_times[msg_id] = sorted(timeline[msg_id]["delivered"])[0]
+    payload_sent = per_node("rpcs_sent") * msg_size
+    payload_received = per_node("rpcs_received") * msg_size
+    control_sent = {}
+    control_received = {}
+    for name, (sent, received) in control_kinds.items():
+        control_sent[name] = per_node(sent)
+        control_received[name] = per_node(received)
+
+    return {
+        "nodes": nodes,
+        "payload_sent": payload_sent,
+        "payload_received": payload_received,
+        "control_sent": control_sent,
+        "control_received": control_received,
+        "wire_sent": wire_sent,
+        "wire_received": wire_received,
+        "bytes_moved": int(payload_sent.sum()),
+        "amplification": payload_sent.sum() / (msg_size * len(nodes) * num_msgs),
+    }
 
-                # received time is the time at which the last message (any msg_id) was received
-                if first_receive == 0.0 or rx_times[msg_id] < first_receive:
-                    first_receive = rx_times[msg_id]
 
-                if rx_times[msg_id] > last_receive:
-                    last_receive = rx_times[msg_id]
+def write_bandwidth_csv(path, timelines):
+    # one line of totals per scenario
+    columns = [
+        "scenario",
+        "msg_size",
+        "nodes",
+        "num_msgs",
+        "payload_sent",
+        "payload_received",
+        "amplification",
+    ]
+    columns += [f"{name}_sent" for name in control_kinds]
+    # only known from the summaries of the nodes
+    columns += ["wire_sent", "wire_received"]
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, extracted_data in timelines.items():
+            params = scenario_params(key)
+            bandwidth = analyse_bandwidth(
+                extracted_data, params["msg_size"], params["num_msgs"]
+            )
+            row = [
+                key,
+                params["msg_size"],
+                len(bandwidth["nodes"]),
+                params["num_msgs"],
+                bandwidth["bytes_moved"],
+                int(bandwidth["payload_received"].sum()),
+                f"{bandwidth['amplification']:.3f}",
+            ]
+            row += [int(counts.sum()) for counts in bandwidth["control_sent"].values()]
+            row += [
+                "" if bandwidth[wire] is None else int(bandwidth[wire].sum())
+                for wire in ["wire_sent", "wire_received"]
+            ]
+            f.write(",".join(map(str, row)) + "\n")
 
-                received += 1
 
-            else:
-                rx_times[msg_id] = 0.0
+def peer_nodes(store):
+    # the node of every peer id and the peer id of every node, from the peer
+    # ids the nodes log at startup. The trailing -1 of the nodes is for the
+    # events without a peer.
+    node_of_peer = np.full(len(store.strings["peers"]) + 1, -1, dtype=np.int64)
+    node_of_peer[store.column("identity", "peer")] = store.column("identity", "node")
+    peer_of_node = np.full(len(store.nodes), -1, dtype=np.int64)
+    peer_of_node[store.column("identity", "node")] = store.column("identity", "peer")
+    return node_of_peer, peer_of_node
+
+
+def first_deliveries(store):
+    # the node, message, time and sender of the first delivery of every
+    # (node, message)
+    time = store.column("delivered", "time")
+    node = store.column("delivered", "node").astype(np.int64)
+    msg = store.column("delivered", "msg").astype(np.int64)
+    order = np.lexsort((time, node, msg))
+    cell = msg[order] * len(store.nodes) + node[order]
+    first = order[np.r_[True, cell[1:] != cell[:-1]]] if len(order) else order
+    peer = store.column("delivered", "peer")[first].astype(np.int64)
+    return node[first], msg[first], time[first], peer
+
+
+def propagation_trees(extracted_data):
+    # The tree every message spread along: the parent of a node is the node
+    # it first delivered the message from, found through the peer id every
+    # node logs at startup. The matrices are messages x nodes, and a node is
+    # only in the tree of a message (hops >= 0) if its chain of parents goes
+    # back to the publisher. The timelines of a *.tln.json have no peers, so
+    # only the publishers are in their trees.
+    store = as_event_store(extracted_data)
+    nodes = list(store.nodes)
+    n = len(nodes)
+    m = len(store.strings["msgs"])
+
+    node_of_peer, _ = peer_nodes(store)
+    parent = np.full(m * n, -1, dtype=np.int64)
+    arrival = np.full(m * n, np.nan)
+    node, msg, time, peer = first_deliveries(store)
+    cells = msg * n + node
+    parent[cells] = node_of_peer[peer]
+    arrival[cells] = time
+
+    # the publishers are the roots, at the time they published
+    time = store.column("published", "time")
+    cells = store.column("published", "msg").astype(np.int64) * n + store.column(
+        "published", "node"
+    )
+    is_root = np.zeros(m * n, dtype=bool)
+    is_root[cells] = True
+    parent[cells] = -1
+    arrival[cells[::-1]] = time[::-1]
+
+    # pointer jumping: every round, a node adds the hops of the ancestor it
+    # points to and points to that ancestor's ancestor instead
+    index = np.arange(m * n)
+    own = index % n
+    parent[parent == own] = -1
+    up = np.where(parent >= 0, index - own + parent, index)
+    hops = (parent >= 0).astype(np.int64)
+    for _ in range(max(1, n).bit_length() + 1):
+        hops += hops[up] * (up != index)
+        up = up[up]
+    # a node that doesn't point to a root now has no publisher in its
+    # ancestors, or is in a cycle
+    in_tree = is_root[up] & ~np.isnan(arrival)
+    hops[~in_tree] = -1
+
+    hop_latency = np.full(m * n, np.nan)
+    child = np.flatnonzero(in_tree & (parent >= 0))
+    hop_latency[child] = arrival[child] - arrival[child - own[child] + parent[child]]
+
+    # the path from the publisher to the node that got the message last
+    critical_paths = {}
+    for col, msg_id in enumerate(store.strings["msgs"]):
+        row = np.where(
+            in_tree[col * n : (col + 1) * n], arrival[col * n : (col + 1) * n], -np.inf
+        )
+        if n == 0 or np.isneginf(row).all():
+            continue
+        path = [int(np.argmax(row))]
+        while parent[col * n + path[-1]] >= 0:
+            path.append(int(parent[col * n + path[-1]]))
+        critical_paths[msg_id] = [nodes[i] for i in reversed(path)]
+
+    return {
+        "nodes": nodes,
+        "msgs": list(store.strings["msgs"]),
+        "parent": parent.reshape(m, n),
+        "arrival": arrival.reshape(m, n),
+        "hops": hops.reshape(m, n),
+        "hop_latency": hop_latency.reshape(m, n),
+        "critical_paths": critical_paths,
+    }
+
+
+def write_propagation_csv(path, timelines):
+    # one line per scenario with the hops, the hop latencies and the longest
+    # critical path of its messages
+    columns = [
+        "scenario",
+        "mean_hops",
+        "max_hops",
+        "mean_hop_latency",
+        "max_hop_latency",
+        "critical_path_hops",
+        "critical_path_latency",
+    ]
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, extracted_data in timelines.items():
+            trees = propagation_trees(extracted_data)
+            hops = trees["hops"][trees["hops"] >= 0]
+            latency = trees["hop_latency"][~np.isnan(trees["hop_latency"])]
+            rows = {node_id: row for row, node_id in enumerate(trees["nodes"])}
+            longest = (0, 0.0)
+            for col, msg_id in enumerate(trees["msgs"]):
+                path = trees["critical_paths"].get(msg_id)
+                if path is None:
+                    continue
+                arrival = trees["arrival"][col]
+                longest = max(
+                    longest,
+                    (len(path) - 1, arrival[rows[path[-1]]] - arrival[rows[path[0]]]),
+                )
+            row = [
+                key,
+                f"{hops.mean():.3f}" if len(hops) else "nan",
+                hops.max() if len(hops) else -1,
+                f"{latency.mean():.6f}" if len(latency) else "nan",
+                f"{latency.max():.6f}" if len(latency) else "nan",
+                longest[0],
+                f"{longest[1]:.6f}",
+            ]
+            f.write(",".join(map(str, row)) + "\n")
+
+
+# the ways a node first gets a message from a peer: pushed to it by a mesh
+# peer, IHAVE -> IWANT -> Publish, or IANNOUNCE -> INEED -> Publish
+PATHS = ["eager", "ihave", "announce"]
+
+
+def first_times(key, time):
+    # the time of the first event of every key, as sorted keys to search and
+    # their times
+    order = np.lexsort((time, key))
+    key = key[order]
+    first = np.r_[True, key[1:] != key[:-1]] if len(key) else np.zeros(0, dtype=bool)
+    return key[first], time[order][first]
+
+
+def event_keys(store, kind):
+    # the (node, message, peer) of every event of a kind as one integer, the
+    # peer -1 of the events without one being the last peer
+    n_msgs = len(store.strings["msgs"])
+    n_peers = len(store.strings["peers"]) + 1
+    return (
+        store.column(kind, "node").astype(np.int64) * n_msgs + store.column(kind, "msg")
+    ) * n_peers + store.column(kind, "peer") % n_peers
+
+
+def first_event_times(store, kind):
+    # the time of the first event of every (node, message, peer) of a kind
+    return first_times(event_keys(store, kind), store.column(kind, "time"))
+
+
+def lookup_times(index, keys):
+    # the times of the keys in an index of first_event_times, nan if missing
+    sorted_keys, times = index
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), np.nan)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[pos] == keys, times[pos], np.nan)
 
-            dups += len(timeline[msg_id]["duplicate"])
 
-            if msg_id not in arrival_times:
-                arrival_times[msg_id] = []
+def latency_breakdown(extracted_data):
+    # Splits the first delivery of every (node, message) by the path it came
+    # along. The announce wait is from the IANNOUNCE or IHAVE to the INEED or
+    # IWANT, the request round trip from the INEED or IWANT to receiving the
+    # message and the transfer from the sender sending the message to
+    # receiving it, the last leg of the round trip for a requested message. A
+    # component that doesn't apply, or whose events weren't logged (e.g. the
+    # sender's side at a lower verbosity), is nan.
+    store = as_event_store(extracted_data)
+    n_msgs = len(store.strings["msgs"])
+    n_peers = len(store.strings["peers"]) + 1
 
-            # this can be negative if the message was not received
-            arrival_times[msg_id].append(
-                (id, rx_times[msg_id] - publishing_times[msg_id])
+    node_of_peer, peer_of_node = peer_nodes(store)
+    node, msg, delivered, peer = first_deliveries(store)
+    sender = node_of_peer[peer]
+    # the events of the node with the sender, and of the sender with the node
+    key = (node * n_msgs + msg) * n_peers + peer % n_peers
+    peer_of_receiver = np.where(sender >= 0, peer_of_node[node], -1)
+    sender_key = (
+        np.maximum(sender, 0) * n_msgs + msg
+    ) * n_peers + peer_of_receiver % n_peers
+
+    def times(kind, keys=key):
+        return lookup_times(first_event_times(store, kind), keys)
+
+    ineed = times("ineeds_sent")
+    iwant = times("iwants_sent")
+    path = np.zeros(len(node), dtype=np.int64)
+    path[iwant <= delivered] = PATHS.index("ihave")
+    path[ineed <= delivered] = PATHS.index("announce")
+    request = np.where(path == PATHS.index("announce"), ineed, iwant)
+    request[path == PATHS.index("eager")] = np.nan
+    advert = np.where(
+        path == PATHS.index("announce"),
+        times("iannounces_received"),
+        times("ihaves_received"),
+    )
+    advert[path == PATHS.index("eager")] = np.nan
+
+    sent = times("rpcs_sent", sender_key)
+    sent[sender < 0] = np.nan
+    received = times("rpcs_received")
+    received = np.where(
+        np.isnan(received) | (received > delivered), delivered, received
+    )
+
+    return {
+        "node": node,
+        "msg": msg,
+        "path": path,
+        "announce_wait": request - advert,
+        "request_rtt": received - request,
+        "transfer": received - sent,
+        "delivered": delivered,
+    }
+
+
+def write_latency_csv(path, timelines):
+    # one line per scenario and path with the count of first deliveries and
+    # the median and 90th percentile of every component
+    components = ["announce_wait", "request_rtt", "transfer"]
+    columns = ["scenario", "path", "deliveries"]
+    columns += [f"{name}_{q}" for name in components for q in ["p50", "p90"]]
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, extracted_data in timelines.items():
+            breakdown = latency_breakdown(extracted_data)
+            for code, name in enumerate(PATHS):
+                selected = breakdown["path"] == code
+                row = [key, name, int(selected.sum())]
+                for component in components:
+                    values = breakdown[component][selected]
+                    values = values[~np.isnan(values)]
+                    if len(values) == 0:
+                        row += ["nan", "nan"]
+                    else:
+                        row += [f"{q:.6f}" for q in np.percentile(values, [50, 90])]
+                f.write(",".join(map(str, row)) + "\n")
+
+
+# why a node got a message again from a peer: the peer sent it before it
+# could know the node had it, the node's IDONTWANT to the peer came too late
+# to stop it, or the node asked a peer that ignores INEEDs and got it from
+# another one on top
+DUPLICATE_CAUSES = ["race", "late_cancel", "ignored_ineed"]
+
+
+def next_times(key, time, after_key, after_time):
+    # the time of the first "after" event of the same key at or after every
+    # event, nan if there is none, by merging both sorted by (key, time)
+    keys = np.concatenate([key, after_key])
+    is_after = np.r_[
+        np.zeros(len(key), dtype=bool), np.ones(len(after_key), dtype=bool)
+    ]
+    # an event comes before the "after" events of the same time
+    order = np.lexsort((is_after, np.concatenate([time, after_time]), keys))
+    keys = keys[order]
+    times = np.concatenate([time, after_time])[order]
+    end = len(order)
+    candidate = np.where(is_after[order], np.arange(end), end)
+    following = np.minimum.accumulate(candidate[::-1])[::-1]
+    found = following < end
+    following = np.minimum(following, end - 1)
+    found &= keys[following] == keys
+    result = np.empty(end)
+    result[order] = np.where(found, times[following], np.nan)
+    return result[: len(key)]
+
+
+def duplicate_attribution(extracted_data):
+    # The cause of every duplicate, from the IDONTWANTs and INEEDs the node
+    # sent to the peer of the duplicate, joined on (node, message, peer). It is
+    # an ignored INEED if the node had sent the peer an INEED and got nothing
+    # from it between the INEED and the duplicate, a late cancel if the node
+    # had sent the peer an IDONTWANT and a race otherwise. An ignored INEED
+    # comes first: the node only sends an IDONTWANT to a peer it asked for the
+    # message once it got the message elsewhere, because the peer didn't answer.
+    store = as_event_store(extracted_data)
+
+    key = event_keys(store, "duplicate")
+    time = store.column("duplicate", "time")
+    cause = np.zeros(len(key), dtype=np.int64)
+
+    cancelled = lookup_times(first_event_times(store, "idontwants_sent"), key)
+    cause[cancelled <= time] = DUPLICATE_CAUSES.index("late_cancel")
+
+    # the first INEED of every (node, message, peer) and the first message
+    # received from the peer at or after it
+    ineeds = event_keys(store, "ineeds_sent")
+    asked = store.column("ineeds_sent", "time")
+    answers = next_times(
+        ineeds,
+        asked,
+        event_keys(store, "rpcs_received"),
+        store.column("rpcs_received", "time"),
+    )
+    # the answer of the first INEED is the earliest one, as a later INEED
+    # can't have an earlier answer
+    asked = lookup_times(first_times(ineeds, asked), key)
+    answered = lookup_times(first_times(ineeds, answers), key)
+    ignored = (asked <= time) & ~(answered < time)
+    cause[ignored] = DUPLICATE_CAUSES.index("ignored_ineed")
+
+    return {
+        "node": store.column("duplicate", "node"),
+        "msg": store.column("duplicate", "msg"),
+        "peer": store.column("duplicate", "peer"),
+        "time": time,
+        "cause": cause,
+        # how long before the duplicate the IDONTWANT was sent
+        "cancel_lead": time - cancelled,
+    }
+
+
+def write_duplicates_csv(path, timelines):
+    # one line per scenario with the duplicates and the payload they wasted
+    # for every cause
+    columns = ["scenario", "duplicates", "wasted_bytes"]
+    columns += [
+        f"{cause}{suffix}" for suffix in ["", "_bytes"] for cause in DUPLICATE_CAUSES
+    ]
+    columns += ["late_cancel_lead_p50"]
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, extracted_data in timelines.items():
+            msg_size = scenario_params(key)["msg_size"]
+            attribution = duplicate_attribution(extracted_data)
+            counts = np.bincount(attribution["cause"], minlength=len(DUPLICATE_CAUSES))
+            lead = attribution["cancel_lead"][
+                attribution["cause"] == DUPLICATE_CAUSES.index("late_cancel")
+            ]
+            row = [key, int(counts.sum()), int(counts.sum()) * msg_size]
+            row += counts.tolist() + (counts * msg_size).tolist()
+            row += [f"{np.median(lead):.6f}" if len(lead) else "nan"]
+            f.write(",".join(map(str, row)) + "\n")
+
+
+def replay_edges(n, time, src, dst, up, at):
+    # Replays the updates of a directed graph of n nodes in time order: the
+    # edge src -> dst is there after an update with up set and gone after one
+    # without. Yields the edges (as src * n + dst) and the out-degrees at
+    # every time of `at`, which is sorted. Only the edges an update flips
+    # between two times are touched.
+    order = np.argsort(time, kind="stable")
+    edges, edge = np.unique(
+        src[order].astype(np.int64) * n + dst[order], return_inverse=True
+    )
+    up = up[order]
+    state = np.zeros(len(edges), dtype=bool)
+    degree = np.zeros(n, dtype=np.int64)
+    ends = np.searchsorted(time[order], at, side="right")
+    start = 0
+    for end in ends:
+        # the last update of every edge among the ones since the last time
+        last, first = np.unique(edge[start:end][::-1], return_index=True)
+        new = up[start:end][::-1][first]
+        flipped = state[last] != new
+        np.add.at(degree, edges[last[flipped]] // n, np.where(new[flipped], 1, -1))
+        state[last] = new
+        start = end
+        yield edges[state], degree
+
+
+def graph_diameter(n, edges):
+    # The longest shortest path between two nodes of the undirected graph,
+    # with a BFS from every node over the sorted edge list, a hop of all the
+    # frontier at once. The second value is False if the BFSs found more than
+    # one component.
+    src = edges // n
+    dst = edges % n
+    src, dst = np.r_[src, dst], np.r_[dst, src]
+    order = np.argsort(src, kind="stable")
+    neighbours = dst[order]
+    starts = np.searchsorted(src[order], np.arange(n + 1))
+
+    def bfs(source):
+        # the hops from the source to every node, -1 if it can't reach it
+        hops = np.full(n, -1)
+        hops[source] = 0
+        frontier = np.array([source])
+        depth = 0
+        while len(frontier):
+            counts = starts[frontier + 1] - starts[frontier]
+            offsets = np.repeat(starts[frontier] - np.cumsum(counts) + counts, counts)
+            reached = neighbours[offsets + np.arange(counts.sum())]
+            frontier = np.unique(reached[hops[reached] < 0])
+            depth += 1
+            hops[frontier] = depth
+        return hops
+
+    diameter = 0
+    components = 0
+    seen = np.zeros(n, dtype=bool)
+    for source in range(n):
+        hops = bfs(source)
+        diameter = max(diameter, int(hops.max()))
+        if not seen[source]:
+            components += 1
+            seen |= hops >= 0
+    return diameter, components <= 1
+
+
+def mesh_overlay(extracted_data, interval):
+    # The mesh every node has at every heartbeat, replayed from its grafts and
+    # prunes (a removed peer leaves the mesh too), and the peers it is
+    # connected to. The nodes don't log their heartbeats, which every node
+    # ticks on its own, so the heartbeats are a fixed sampling grid of the
+    # heartbeat interval from the first connection. The degrees are
+    # heartbeats x nodes, the churn is the grafts and prunes since the
+    # previous heartbeat, and the diameter is the one of the mesh (an edge if
+    # either side grafted the other) at the time every message was published.
+    store = as_event_store(extracted_data)
+    n = len(store.nodes)
+    node_of_peer, _ = peer_nodes(store)
+
+    def updates(kinds, up_kinds):
+        columns = [
+            (
+                store.column(kind, "time"),
+                store.column(kind, "node"),
+                node_of_peer[store.column(kind, "peer")],
+                kind in up_kinds,
             )
+            for kind in kinds
+        ]
+        time = np.concatenate([c[0] for c in columns])
+        src = np.concatenate([c[1] for c in columns]).astype(np.int64)
+        dst = np.concatenate([c[2] for c in columns])
+        up = np.concatenate([np.full(len(c[0]), c[3]) for c in columns])
+        # the peers that aren't nodes of the simulation are left out
+        known = dst >= 0
+        return time[known], src[known], dst[known], up[known]
+
+    mesh = updates(["grafted", "pruned", "removed"], ["grafted"])
+    peers = updates(["added", "removed"], ["added"])
+
+    # the sampling grid, from the first connection to the last delivery
+    times = np.concatenate([mesh[0], peers[0], store.column("delivered", "time")])
+    if len(times) == 0:
+        heartbeats = np.zeros(0)
+    else:
+        heartbeats = np.arange(times.min(), times.max() + interval, interval)
 
-        rx_msgs.append(shouldhave - received)
-        dup_msgs.append(dups)
+    mesh_degree = np.zeros((len(heartbeats), n), dtype=np.int64)
+    for i, (_, degree) in enumerate(replay_edges(n, *mesh, heartbeats)):
+        mesh_degree[i] = degree
+    peer_degree = np.zeros((len(heartbeats), n), dtype=np.int64)
+    for i, (_, degree) in enumerate(replay_edges(n, *peers, heartbeats)):
+        peer_degree[i] = degree
 
-        if first_receive == 0.0 or last_receive == 0.0:
-            # the node for some reason did not receive any messages
-            continue  # TODO: there must be implication of this on the plot. Resolve them
+    bins = np.r_[-np.inf, heartbeats]
+    grafts = np.histogram(store.column("grafted", "time"), bins)[0]
+    prunes = np.histogram(store.column("pruned", "time"), bins)[0]
 
-        if "f2l" not in arrival_times:
-            arrival_times["f2l"] = []
+    published = store.column("published", "time")
+    order = np.argsort(published, kind="stable")
+    msgs = store.column("published", "msg")[order]
+    diameter = {}
+    connected = {}
+    previous = None
+    for msg, (edges, _) in zip(msgs, replay_edges(n, *mesh, published[order])):
+        # the messages are published in bursts, the mesh rarely changes
+        # between two of them
+        if previous is None or not np.array_equal(edges, previous[0]):
+            previous = (edges.copy(), graph_diameter(n, edges))
+        msg_id = store.strings["msgs"][msg]
+        diameter[msg_id], connected[msg_id] = previous[1]
 
-        if "l2f" not in arrival_times:
-            arrival_times["l2f"] = []
+    return {
+        "nodes": list(store.nodes),
+        "heartbeats": heartbeats,
+        "mesh_degree": mesh_degree,
+        "peer_degree": peer_degree,
+        "grafts": grafts,
+        "prunes": prunes,
+        "diameter": diameter,
+        "connected": connected,
+    }
 
-        arrival_times["f2l"].append((id, last_receive - first_publish))
-        arrival_times["l2f"].append((id, first_receive - last_publish))
 
-    return arrival_times, rx_msgs, dup_msgs
+def write_mesh_csv(path, timelines):
+    # one line per scenario with the mesh degrees over all the heartbeats,
+    # the grafts and prunes per node per second and the diameter of the mesh
+    # when the messages were published. The start and interval of the
+    # sampling grid of the heartbeats are the last columns.
+    columns = [
+        "scenario",
+        "mesh_degree_p10",
+        "mesh_degree_p50",
+        "mesh_degree_p90",
+        "peer_degree_p50",
+        "grafts_per_node_sec",
+        "prunes_per_node_sec",
+        "max_diameter",
+        "connected",
+        "grid_start",
+        "grid_interval",
+    ]
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, extracted_data in timelines.items():
+            interval = scenario_params(key)["interval"]
+            overlay = mesh_overlay(extracted_data, interval)
+            n = len(overlay["nodes"])
+            seconds = len(overlay["heartbeats"]) * interval
+            degree = overlay["mesh_degree"]
+            row = [key]
+            if degree.size:
+                row += np.percentile(degree, [10, 50, 90]).tolist()
+                row += [np.median(overlay["peer_degree"])]
+            else:
+                row += ["nan"] * 4
+            for counts in [overlay["grafts"], overlay["prunes"]]:
+                row += [
+                    f"{counts.sum() / (n * seconds):.4f}" if seconds and n else "nan"
+                ]
+            row += [
+                max(overlay["diameter"].values(), default=-1),
+                all(overlay["connected"].values()),
+                overlay["heartbeats"][0] if seconds else "nan",
+                interval,
+            ]
+            f.write(",".join(map(str, row)) + "\n")
 
 
-def plot_cdf(data, label):
-    x = [v for _, v in data]
-    y = np.arange(len(data)) / float(len(data))
+# the number of points a CDF is drawn with, whatever the number of nodes
+CDF_POINTS = 200
 
-    x.sort()
 
+def cdf_points(values, points=CDF_POINTS):
+    # the CDF of the values at evenly spaced proportions
+    y = np.linspace(0.0, 1.0, points)
+    if len(values) == 0:
+        return np.zeros(0), np.zeros(0)
+    return np.quantile(values, y), y
+
+
+def plot_cdf(data, label):
+    x, y = cdf_points([v for _, v in data])
     plt.plot(x, y, label=label)
 
 
+def scenario_metrics(extracted_data, num_msgs):
+    # what the plots and the printed summary need of a scenario
+    arr_times, rx_count, dups = analyse_timelines(extracted_data, num_msgs)
+    return {
+        "f2l": cdf_points([v for _, v in arr_times["f2l"]]),
+        "band": None,
+        "dups": np.mean(dups),
+        "lost": np.mean(rx_count),
+    }
+
+
+# the resamples of the bootstrap over replicates
+BOOTSTRAP_RESAMPLES = 1000
+
+
+def replicate_keys(key, replicates):
+    # the scenario keys of the runs of sweep.py --replicates
+    if replicates <= 1:
+        return [key]
+    return [f"{key}-r{r}" for r in range(replicates)]
+
+
+def replicate_samples(extracted_data, num_msgs):
+    # the arrival times of the nodes that got the messages, and the
+    # duplicates and lost messages of every node, of one replicate
+    arr_times, rx_count, dups = analyse_timelines(extracted_data, num_msgs)
+    return (
+        np.array([v for _, v in arr_times["f2l"]]),
+        np.array(dups, dtype=np.float64),
+        np.array(rx_count, dtype=np.float64),
+    )
+
+
+def grid_median(grid, cdfs):
+    # the median of CDFs on a grid, interpolated in the step that reaches a
+    # half
+    cdfs = np.asarray(cdfs)
+    step = np.argmax(cdfs >= 0.5, axis=-1)
+    before = np.maximum(step - 1, 0)
+    low = np.take_along_axis(cdfs, before[..., None], axis=-1)[..., 0]
+    high = np.take_along_axis(cdfs, step[..., None], axis=-1)[..., 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.where(step > 0, (0.5 - low) / (high - low), 0.0)
+    return grid[before] + share * (grid[step] - grid[before])
+
+
+def bootstrap_replicates(task):
+    # A two-level bootstrap: every resample draws the replicates with
+    # replacement, and the nodes of every drawn replicate with replacement.
+    # The draws are multinomial counts, so a resample of the pooled CDF is a
+    # weighted sum of the nodes below every point of the grid, and the whole
+    # bootstrap is a few matrix products per replicate. A replicate drawn k
+    # times gets k independent draws of its nodes, which together are one
+    # multinomial draw of k times its nodes.
+    samples, resamples, seed, points = task
+    rng = np.random.default_rng(seed)
+    n = len(samples)
+    top = max((f2l.max() for f2l, _, _ in samples if len(f2l)), default=0.0)
+    grid = np.linspace(0.0, top, points)
+
+    picks = rng.multinomial(n, np.full(n, 1.0 / n), size=resamples)
+    below = np.zeros((resamples, points))
+    arrivals = np.zeros(resamples)
+    dups = np.zeros(resamples)
+    lost = np.zeros(resamples)
+    nodes = np.zeros(resamples)
+    for r, (f2l, node_dups, node_lost) in enumerate(samples):
+        if len(f2l):
+            weights = rng.multinomial(
+                picks[:, r] * len(f2l), np.full(len(f2l), 1.0 / len(f2l))
+            )
+            below += weights @ (f2l[:, None] <= grid).astype(np.float64)
+            arrivals += picks[:, r] * len(f2l)
+        if len(node_dups):
+            weights = rng.multinomial(
+                picks[:, r] * len(node_dups),
+                np.full(len(node_dups), 1.0 / len(node_dups)),
+            )
+            dups += weights @ node_dups
+            lost += weights @ node_lost
+            nodes += picks[:, r] * len(node_dups)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cdfs = below / arrivals[:, None]
+        dups /= nodes
+        lost /= nodes
+
+    f2l = np.concatenate([f2l for f2l, _, _ in samples])
+    node_dups = np.concatenate([node_dups for _, node_dups, _ in samples])
+    node_lost = np.concatenate([node_lost for _, _, node_lost in samples])
+    cdf = (f2l[:, None] <= grid).mean(axis=0) if len(f2l) else np.zeros(points)
+    # the resamples that drew only replicates without arrivals (or without
+    # nodes) have no CDF (or no averages), they are left out of the intervals
+    # and counted
+    empty = arrivals == 0
+
+    def interval(values, empty=empty):
+        values = values[~empty]
+        return (
+            np.percentile(values, [2.5, 97.5], axis=0)
+            if len(values)
+            else np.full((2, *values.shape[1:]), np.nan)
+        )
+
+    return {
+        "grid": grid,
+        "cdf": cdf,
+        "cdf_band": interval(cdfs),
+        # the median and its interval both from the CDFs on the grid, so the
+        # estimate is read the same way as the resamples
+        "f2l_median": grid_median(grid, cdf) if len(f2l) else np.nan,
+        "f2l_median_ci": interval(grid_median(grid, cdfs)),
+        "empty_resamples": int(empty.sum()),
+        "dups": node_dups.mean() if len(node_dups) else np.nan,
+        "dups_ci": interval(dups, nodes == 0),
+        "lost": node_lost.mean() if len(node_lost) else np.nan,
+        "lost_ci": interval(lost, nodes == 0),
+    }
+
+
+def bootstrap_scenarios(samples, jobs=1, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    # the bootstrap of every scenario of {key: replicate samples}, one
+    # scenario per worker
+    tasks = [
+        (replicates, resamples, seed, CDF_POINTS) for replicates in samples.values()
+    ]
+    if jobs <= 1:
+        return dict(zip(samples, map(bootstrap_replicates, tasks)))
+    with multiprocessing.Pool(jobs) as pool:
+        return dict(zip(samples, pool.map(bootstrap_replicates, tasks)))
+
+
+def write_replicates_csv(path, bootstraps):
+    # one line per scenario with the estimates and their 95% intervals
+    columns = ["scenario"]
+    for name in ["f2l_median", "dups", "lost"]:
+        columns += [name, f"{name}_low", f"{name}_high"]
+    columns.append("empty_resamples")
+    with open(path, "w") as f:
+        f.write(",".join(columns) + "\n")
+        for key, bootstrap in bootstraps.items():
+            row = [key]
+            for name in ["f2l_median", "dups", "lost"]:
+                row += [
+                    f"{value:.6f}"
+                    for value in [bootstrap[name], *bootstrap[f"{name}_ci"]]
+                ]
+            row.append(str(bootstrap["empty_resamples"]))
+            f.write(",".join(row) + "\n")
+
+
+def render_figure(figure):
+    # draws one figure of CDFs from precomputed points and closes it, so a
+    # worker holds one figure at a time
+    plt.switch_backend("Agg")
+    fig = plt.figure(figsize=(8, 6))
+    for label, (x, y), band in figure["cdfs"]:
+        line = plt.plot(x, y, label=label)[0]
+        if band is not None:
+            plt.fill_between(
+                x, band[0], band[1], color=line.get_color(), alpha=0.2, linewidth=0
+            )
+    plt.xlabel("Message Arrival Time")
+    plt.ylabel("Cumulative Proportion of Nodes")
+    plt.xlim(0.0, figure["xlim"])
+    plt.title(figure["title"])
+    plt.grid(True)
+    plt.legend()
+    fig.savefig(figure["path"])
+    plt.close(fig)
+    return figure["path"]
+
+
+def render_figures(figures, jobs=1):
+    if jobs <= 1:
+        for figure in figures:
+            yield render_figure(figure)
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        yield from pool.imap_unordered(render_figure, figures)
+
+
 if __name__ == "__main__":
-    count = int(sys.argv[1])
-    reparse = True
+    parser = argparse.ArgumentParser()
+    parser.add_argument("count", type=int, help="number of nodes in each simulation")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="number of worker processes used to parse the logs and draw the plots",
+    )
+    parser.add_argument(
+        "--cache",
+        default="analysed_timeline.tln",
+        help="directory where the parsed scenarios are cached",
+    )
+    parser.add_argument(
+        "--reparse",
+        action="store_true",
+        help="parse every scenario even if its cache is up to date",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="also hash the contents of the logs to tell if a cache is stale",
+    )
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=1,
+        help="runs of every scenario, as written by sweep.py --replicates",
+    )
+    parser.add_argument(
+        "--summaries",
+        action="store_true",
+        help="read the summaries of the nodes (network_graph.py summary) instead of parsing the logs",
+    )
+    parser.add_argument(
+        "--timelines",
+        help="use a *.tln.json file from an older version instead of the logs",
+    )
+    args = parser.parse_args()
+
+    count = args.count
 
-    timelines = {}
     # this value is tuned after running this script for a couple times
     max_arr_time_size = 20.0
     # this value is tuned after running this script for a couple times
     max_arr_time_num = 20.0
 
-    announce_list = [0, 7, 8]
-    size_list = [128, 256, 512, 1024, 2048, 4096, 8192]
-    num_list = [1, 2, 4, 8, 16, 32, 64]
-    malicious_list = [5, 10, 20, 30, 50]
-
-    files = glob.glob("*.tln.json")
-    if len(files) > 0:
-        print("Found saved timelines")
-        for i, file in enumerate(files):
-            print(f"{i + 1}. {file}")
-        use_saved = input(f"Enter which timeline file to use ({1}-{len(files)}/n):")
-        idx = ord(use_saved) - 49
-        if idx >= 0 and idx < len(files):
-            reparse = False
-            with open(files[idx], "r") as f:
-                print("Loading timeline file")
-                timelines = json.load(f)
-
-    if reparse:
-        print("Parsing log files")
-        # read all simulations
-        for announce in announce_list:
-            for msg_size in size_list:
-                timeline_key = f"{msg_size}-{announce}-1"
-                print(timeline_key)
-                timelines[timeline_key] = extract_node_timelines(
-                    f"shadow-{timeline_key}.data", count
-                )
+    if args.timelines is not None:
+        print("Loading timeline file")
+        with open(args.timelines, "r") as f:
+            timelines = json.load(f)
+    else:
+        keys = [
+            replicate
+            for key in scenario_keys()
+            for replicate in replicate_keys(key, args.replicates)
+        ]
+        if args.summaries:
+            print("Loading summaries")
+            timelines = load_summaries(keys, count)
+        else:
+            timelines = load_timelines(
+                keys, count, args.cache, args.jobs, args.reparse, args.hash
+            )
 
-        # read all simulations
-        for announce in announce_list:
-            for num_msgs in num_list:
-                timeline_key = f"128-{announce}-{num_msgs}"
-                print(timeline_key)
-                timelines[timeline_key] = extract_node_timelines(
-                    f"shadow-{timeline_key}.data", count
-                )
+    # the metrics are computed once per scenario, the figures only get the
+    # points of their CDFs
+    metrics_of = {}
+    if args.replicates > 1:
+        # the replicates of a scenario are pooled, with bootstrap bands
+        samples = {}
+        for key in scenario_keys():
+            num_msgs = scenario_params(key)["num_msgs"]
+            samples[key] = [
+                replicate_samples(timelines[replicate], num_msgs)
+                for replicate in replicate_keys(key, args.replicates)
+            ]
+        bootstraps = bootstrap_scenarios(samples, args.jobs)
+        for key, bootstrap in bootstraps.items():
+            metrics_of[key] = {
+                "f2l": (bootstrap["grid"], bootstrap["cdf"]),
+                "band": bootstrap["cdf_band"],
+                "dups": bootstrap["dups"],
+                "lost": bootstrap["lost"],
+            }
+        write_replicates_csv("./plots/replicates.csv", bootstraps)
+        print("replicates saved")
+
+    # the figures: for every Dannounce, the CDFs of 1 message of every size,
+    # of every number of 128KB messages and of 16 128KB messages with every
+    # percent of malicious nodes
+    groups = [
+        (
+            "sizes",
+            max_arr_time_size,
+            [(f"{msg_size}-{{}}-1", f"{msg_size}KB message") for msg_size in size_list],
+        ),
+        (
+            "num",
+            max_arr_time_num,
+            [
+                (f"128-{{}}-{num_msgs}", f"{num_msgs} num of msgs")
+                for num_msgs in num_list
+            ],
+        ),
+        (
+            "malicious",
+            max_arr_time_num,
+            [
+                (f"malicious-{malicious}-{{}}", f"{malicious}% malicious nodes")
+                for malicious in malicious_list
+            ],
+        ),
+    ]
 
-        # read all simulations
+    figures = []
+    for group, xlim, curves in groups:
         for announce in announce_list:
-            for malicious in malicious_list:
-                timeline_key = f"malicious-{malicious}-{announce}"
-                print(timeline_key)
-                timelines[timeline_key] = extract_node_timelines(
-                    f"shadow-{timeline_key}.data", count
-                )
+            print(f"\nAnnouncement Degree = {announce}\n")
+            cdfs = []
+            for key_format, label in curves:
+                timeline_key = key_format.format(announce)
+                print(f"\tAnalysis for {timeline_key}")
+                if timeline_key not in metrics_of:
+                    num_msgs = scenario_params(timeline_key)["num_msgs"]
+                    metrics_of[timeline_key] = scenario_metrics(
+                        timelines[timeline_key], num_msgs
+                    )
+                metrics = metrics_of[timeline_key]
+                cdfs.append((label, metrics["f2l"], metrics["band"]))
+                print(f"\t\tAverage num. of dups: {metrics['dups']}")
+                print(f"\t\tAverage num. lost: {metrics['lost']}")
+            figures.append(
+                {
+                    "path": f"./plots/cdf_{group}_{announce}.png",
+                    "title": f"Message Arrival Times for D=8 & D_announce={announce}",
+                    "xlim": xlim,
+                    "cdfs": cdfs,
+                }
+            )
 
-        with open("analysed_timeline.tln.json", "w") as f:
-            json.dump(timelines, f)
+    for path in render_figures(figures, args.jobs):
+        print(f"{path} saved")
 
-    # 1. plot CDF of arrival times vs. nodes for different message sizes for one msg published
-    # three different plots for different Dannounce. Each plot contains 5 CDFs for different sizes
-    for announce in announce_list:
-        print(f"\nAnnouncement Degree = {announce}\n")
-        plt.figure(figsize=(8, 6))
-        for msg_size in size_list:
-            print(f"\tAnalysis for 1 {msg_size}KB msgs")
-            # only for one message published
-            timeline_key = f"{msg_size}-{announce}-1"
-            arr_times, rx_count, dups = analyse_timelines(timelines[timeline_key], 1)
-            plot_cdf(arr_times["f2l"], f"{msg_size}KB message")
-            print(f"\t\tAverage num. of dups: {sum(dups) / count}")
-            print(f"\t\tAverage num. lost: {sum(rx_count) / count}")
-
-        plt.xlabel("Message Arrival Time")
-        plt.ylabel("Cumulative Proportion of Nodes")
-        plt.xlim(0.0, max_arr_time_size)
-        plt.title(f"Message Arrival Times for D=8 & D_announce={announce}")
-        plt.grid(True)
-        plt.legend()
-        plt.savefig(f"./plots/cdf_sizes_{announce}.png")
-        print("plot saved")
-
-    # 2. plot CDF of arrival times vs. nodes for different numbers of messages(of same size)  published at the same time
-    # three different plots for different Dannounce. Each plot contains 5 CDFs for different num of msgs
-    for announce in announce_list:
-        print(f"\nAnnouncement Degree = {announce}\n")
-        plt.figure(figsize=(8, 6))
-        for num_msgs in num_list:
-            print(f"\tAnalysis for {num_msgs} 128KB msgs")
-            # only for one message published
-            timeline_key = f"{128}-{announce}-{num_msgs}"
-            arr_times, rx_count, dups = analyse_timelines(
-                timelines[timeline_key], num_msgs
-            )
-            plot_cdf(arr_times["f2l"], f"{num_msgs} num of msgs")
-            print(f"\t\tAverage num. of dups: {sum(dups) / count}")
-            print(f"\t\tAverage num. lost: {sum(rx_count) / count}")
-
-        plt.xlabel("Message Arrival Time")
-        plt.ylabel("Cumulative Proportion of Nodes")
-        plt.xlim(0.0, max_arr_time_num)
-        plt.title(f"Message Arrival Times for D=8 & D_announce={announce}")
-        plt.grid(True)
-        plt.legend()
-        plt.savefig(f"./plots/cdf_num_{announce}.png")
-        print("plot saved")
-
-    # 3. plot CDF of arrival times vs. nodes for 16 messages(of same size) published at the same time in presence of malicious nodes
-    # three different plots for different Dannounce. Each plot contains 5 CDFs for different percentages of malicious nodes
-    for announce in announce_list:
-        print(f"\nAnnouncement Degree = {announce}\n")
-        plt.figure(figsize=(8, 6))
-        for malicious in malicious_list:
-            print(f"\tAnalysis for 16x128KB msgs with {malicious}% malicious nodes")
-            # only for one message published
-            timeline_key = f"malicious-{malicious}-{announce}"
-            arr_times, rx_count, dups = analyse_timelines(
-                timelines[timeline_key], 16
-            )
-            plot_cdf(arr_times["f2l"], f"{malicious}% malicious nodes")
-            print(f"\t\tAverage num. of dups: {sum(dups) / count}")
-            print(f"\t\tAverage num. lost: {sum(rx_count) / count}")
-
-        plt.xlabel("Message Arrival Time")
-        plt.ylabel("Cumulative Proportion of Nodes")
-        plt.xlim(0.0, max_arr_time_num)
-        plt.title(f"Message Arrival Times for D=8 & D_announce={announce}")
-        plt.grid(True)
-        plt.legend()
-        plt.savefig(f"./plots/cdf_malicious_{announce}.png")
-        print("plot saved")
+    # 4. bytes moved and control messages sent in every scenario
+    write_bandwidth_csv("./plots/bandwidth.csv", timelines)
+    print("\nbandwidth saved")
+
+    if args.summaries:
+        # the summaries don't have the events the rest is drawn from
+        print("propagation, latency, duplicates and mesh need the logs, skipped")
+    else:
+        # 5. how the messages spread: hops, hop latencies and critical paths
+        write_propagation_csv("./plots/propagation.csv", timelines)
+        print("propagation saved")
+
+        # 6. how long the first deliveries took along every path
+        write_latency_csv("./plots/latency.csv", timelines)
+        print("latency saved")
+
+        # 7. why the duplicates happened and the bytes they wasted
+        write_duplicates_csv("./plots/duplicates.csv", timelines)
+        print("duplicates saved")
+
+        # 8. the mesh over time: degrees, churn and diameter
+        write_mesh_csv("./plots/mesh.csv", timelines)
+        print("mesh saved")
@@ -0,0 +1,231 @@
+# usage: python benchmark.py [--nodes N] [--msgs N] [--fanout N] [--malicious PERCENT] [--against REV]
+#
+# Times the stages of analyse_logs.py on synthetic logs (see synthetic_logs.py)
+# so that the parser and the analysis can be measured without a simulation.
+# Every stage runs in a fresh process; it is timed (best of --repeat) and then
+# run once more under tracemalloc for the peak of its own allocations. The
+# peak RSS is the one of the whole process, inputs included. With --results
+# the numbers are appended as a JSON line to a file, to compare commits.
+# --against REV also times read_node_logs of analyse_logs.py at a git
+# revision on the same logs, and prints how much faster the current one is.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import datetime
+import platform
+import subprocess
+import tracemalloc
+import multiprocessing
+
+import synthetic_logs
+
+STAGES = ["read_node_logs", "extract_node_timelines", "analyse_timelines", "plot_cdf"]
+
+
+def log_files(folder, count):
+    return [
+        os.path.join(folder, "hosts", f"node{id}", "pubsub-shadow.1000.stdout")
+        for id in range(count)
+    ]
+
+
+def setup_stage(stage, folder, count, num_msgs):
+    # returns the function to measure, its inputs are prepared here so that
+    # they aren't measured
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import analyse_logs
+
+    if stage == "read_node_logs":
+        logs = []
+        for path in log_files(folder, count):
+            with open(path, "r") as f:
+                logs.append(f.readlines())
+
+        if not hasattr(analyse_logs, "EventStore"):
+            # an older revision, which returns the timelines of one node
+            return lambda: [analyse_logs.read_node_logs(lines) for lines in logs]
+
+        def run():
+            store = analyse_logs.EventStore()
+            for id, lines in enumerate(logs):
+                analyse_logs.read_node_logs(lines, store, str(id))
+
+        return run
+
+    if stage == "extract_node_timelines":
+        return lambda: analyse_logs.extract_node_timelines(folder, count)
+
+    store = analyse_logs.extract_node_timelines(folder, count)
+    if stage == "analyse_timelines":
+        return lambda: analyse_logs.analyse_timelines(store, num_msgs)
+
+    arr_times, _, _ = analyse_logs.analyse_timelines(store, num_msgs)
+    plot_path = os.path.join(folder, "plot.png")
+
+    def run():
+        plt = analyse_logs.plt
+        plt.figure(figsize=(8, 6))
+        analyse_logs.plot_cdf(arr_times["f2l"], "f2l")
+        analyse_logs.plot_cdf(arr_times["l2f"], "l2f")
+        plt.legend()
+        plt.savefig(plot_path)
+        plt.close()
+
+    return run
+
+
+def measure_stage(task):
+    stage, folder, count, num_msgs, repeat, source = task
+    if source is not None:
+        # the modules of another revision come first
+        sys.path.insert(0, source)
+    run = setup_stage(stage, folder, count, num_msgs)
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+    return {"seconds": min(seconds), "alloc_peak": alloc_peak, "peak_rss": rss}
+
+
+def git_revision(rev="HEAD"):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", rev],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def checkout_modules(rev, folder):
+    # writes the python modules of a revision to folder
+    repo = os.path.dirname(os.path.abspath(__file__))
+    names = subprocess.run(
+        ["git", "ls-tree", "--name-only", rev],
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    for name in names:
+        if name.endswith(".py"):
+            source = subprocess.run(
+                ["git", "show", f"{rev}:{name}"], cwd=repo, capture_output=True, check=True
+            ).stdout
+            with open(os.path.join(folder, name), "wb") as f:
+                f.write(source)
+
+
+def print_result(name, result, lines):
+    result["lines_per_sec"] = lines / result["seconds"]
+    print(
+        f"{name:>24}: {result['seconds']:8.3f}s {result['lines_per_sec']:12.0f} lines/s"
+        f" {result['alloc_peak'] / 1e6:8.1f}MB allocated {result['peak_rss'] / 1e6:8.1f}MB peak RSS"
+    )
+
+
+def benchmark(folder, args):
+    start = time.perf_counter()
+    malicious = synthetic_logs.sample_malicious(args.nodes, args.malicious, random.Random(args.seed))
+    lines = synthetic_logs.generate_logs(
+        folder, args.nodes, args.msgs, args.fanout, malicious, args.seed, args.D, args.announce
+    )
+    size = sum(os.path.getsize(path) for path in log_files(folder, args.nodes))
+    print(f"{lines} lines ({size / 1e6:.1f}MB) generated in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    # a fresh process for every stage, so that the peak RSS of a stage isn't
+    # the one of a previous stage
+    context = multiprocessing.get_context("spawn")
+    for stage in args.stages:
+        with context.Pool(1) as pool:
+            task = (stage, folder, args.nodes, args.msgs, args.repeat, None)
+            results[stage] = pool.apply(measure_stage, (task,))
+        print_result(stage, results[stage], lines)
+
+    speedup = None
+    if args.against is not None:
+        against = git_revision(args.against)
+        source = os.path.join(folder, "against")
+        os.makedirs(source, exist_ok=True)
+        checkout_modules(against, source)
+        # the two parsers are timed in turns, so that a change in the load of
+        # the machine shows in both
+        best = {}
+        for _ in range(args.repeat):
+            for name, source_dir in [("current", None), (against, source)]:
+                with context.Pool(1) as pool:
+                    task = ("read_node_logs", folder, args.nodes, args.msgs, 1, source_dir)
+                    result = pool.apply(measure_stage, (task,))
+                if name not in best or result["seconds"] < best[name]["seconds"]:
+                    best[name] = result
+        results[f"read_node_logs@{against}"] = best[against]
+        print_result(f"read_node_logs@{against}", best[against], lines)
+        speedup = best[against]["seconds"] / best["current"]["seconds"]
+        print(f"read_node_logs is {speedup:.2f}x as fast as at {against}")
+
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "nodes": args.nodes,
+        "msgs": args.msgs,
+        "fanout": args.fanout,
+        "malicious": args.malicious,
+        "announce": args.announce,
+        "seed": args.seed,
+        "lines": lines,
+        "bytes": size,
+        "stages": results,
+        "speedup": speedup,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--msgs", type=int, default=16)
+    parser.add_argument("--fanout", type=int, default=6, help="peers an IHAVE is gossiped to")
+    parser.add_argument("--malicious", type=int, default=0, help="percent of malicious nodes")
+    parser.add_argument("-D", type=int, default=8)
+    parser.add_argument("--announce", type=int, default=0, help="mesh peers the messages are announced to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of a stage, the best is kept")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--dir", help="where to write the logs, a temporary directory by default")
+    parser.add_argument("--results", help="file the results are appended to as a JSON line")
+    parser.add_argument("--against", help="git revision whose read_node_logs is timed too, e.g. be62074")
+    args = parser.parse_args()
+
+    if args.dir is not None:
+        os.makedirs(args.dir, exist_ok=True)
+        record = benchmark(args.dir, args)
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            record = benchmark(folder, args)
+
+    if args.results is not None:
+        with open(args.results, "a") as f:
+            f.write(json.dumps(record) + "\n")
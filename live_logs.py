@@ -0,0 +1,137 @@
+# usage: python live_logs.py [data-dir] [node-count] [num-msgs] [--every SECONDS] [--pid PID] [--trace]
+#
+# Follows the logs of a simulation while shadow is still writing them, e.g.
+# shadow.data or a run directory's shadow-*.data of sweep.py, and prints how
+# many of the messages the nodes have delivered and how many duplicates they
+# got so far. The lines are parsed with the parser of analyse_logs.py as they
+# are written, or their JSONL traces with --trace. Once every node has
+# delivered every message the simulation has nothing left to show; with --pid
+# the shadow process is then stopped instead of running until its stop time.
+import os
+import glob
+import time
+import signal
+import argparse
+
+from analyse_logs import EventStore, node_log_reader, node_trace_reader, BASE_PATH, TRACE_LOGFILE
+
+
+def file_tail(pattern):
+    # returns read() that gives the complete lines appended to the first file
+    # matching the pattern since the previous call, nothing until the file is
+    # there
+    state = {"file": None, "partial": ""}
+
+    def read():
+        if state["file"] is None:
+            paths = glob.glob(pattern)
+            if not paths:
+                return []
+            state["file"] = open(paths[0], "r", encoding="utf-8", errors="replace")
+        text = state["partial"] + state["file"].read()
+        lines = text.split("\n")
+        # the last line may still be being written
+        state["partial"] = lines.pop()
+        return lines
+
+    return read
+
+
+def watch(folder, count, num_msgs, running=lambda: True, every=10.0, poll=1.0, trace=False):
+    # Yields a summary of the logs every `every` seconds, and a last one when
+    # every node has delivered every message or `running` returns False. With
+    # trace the nodes write their events to the JSONL trace instead.
+    store = EventStore()
+    nodes = []
+    for id in range(count):
+        if trace:
+            tail = file_tail(folder + BASE_PATH + str(id) + TRACE_LOGFILE)
+            nodes.append((tail, node_trace_reader(store, str(id))))
+        else:
+            tail = file_tail(folder + BASE_PATH + str(id) + "/pubsub-shadow.*.stdout")
+            nodes.append((tail, node_log_reader(store, str(id))))
+
+    # the (node, message) a node has delivered or published, how far the
+    # columns were counted and the time of the last of those events
+    done = set()
+    last_time = None
+    counted = {"delivered": 0, "published": 0}
+    expected = count * num_msgs
+    lines = 0
+    start = time.monotonic()
+    last = start
+
+    while True:
+        alive = running()
+        for tail, read in nodes:
+            new = tail()
+            if new:
+                read(new)
+                lines += len(new)
+        for kind in counted:
+            cols = store.events[kind]
+            # slices of the columns are copies, so the columns can still grow
+            done.update(zip(cols["node"][counted[kind] :], cols["msg"][counted[kind] :]))
+            if len(cols["time"]) > counted[kind]:
+                last_time = max(last_time or 0.0, max(cols["time"][counted[kind] :]))
+            counted[kind] = len(cols["time"])
+
+        now = time.monotonic()
+        complete = len(done) >= expected
+        if complete or not alive or now - last >= every:
+            last = now
+            yield {
+                "elapsed": now - start,
+                "lines": lines,
+                "delivered": len(done),
+                "expected": expected,
+                "duplicates": len(store.events["duplicate"]["time"]),
+                "last_time": last_time,
+                "complete": complete,
+            }
+        if complete or not alive:
+            return
+        time.sleep(poll)
+
+
+def format_summary(summary):
+    return (
+        f"{summary['elapsed']:7.1f}s {summary['lines']:10d} lines"
+        f" {summary['delivered']}/{summary['expected']} delivered"
+        f" ({100 * summary['delivered'] / max(1, summary['expected']):5.1f}%)"
+        f" {summary['duplicates']} duplicates"
+    )
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", help="the data directory of the simulation")
+    parser.add_argument("count", type=int, help="number of nodes")
+    parser.add_argument("num_msgs", type=int, help="number of messages published")
+    parser.add_argument("--every", type=float, default=10.0, help="seconds between two summaries")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between two reads of the logs")
+    parser.add_argument("--pid", type=int, help="shadow process to stop once every message is delivered")
+    parser.add_argument("--trace", action="store_true", help="follow the JSONL traces of the nodes instead of their logs")
+    args = parser.parse_args()
+
+    running = lambda: True
+    if args.pid is not None:
+        running = lambda: is_running(args.pid)
+
+    for summary in watch(args.folder, args.count, args.num_msgs, running, args.every, args.poll, args.trace):
+        print(format_summary(summary), flush=True)
+        if summary["complete"]:
+            print("every message is delivered")
+            if args.pid is not None and is_running(args.pid):
+                os.kill(args.pid, signal.SIGTERM)
+                print(f"stopped {args.pid}")
@@ -10,12 +10,15 @@ import (
 	"math/rand"
 	"net"
 	"os"
+	"os/signal"
+	"syscall"
 	"time"
 
 	"github.com/libp2p/go-libp2p"
 	pubsub "github.com/libp2p/go-libp2p-pubsub"
 	pubsubpb "github.com/libp2p/go-libp2p-pubsub/pb"
 	"github.com/libp2p/go-libp2p/core/crypto"
+	"github.com/libp2p/go-libp2p/core/host"
 	"github.com/libp2p/go-libp2p/core/peer"
 )
 
@@ -32,6 +35,11 @@ var (
 	intervalFlag    = flag.Int("interval", 700, "heartbeat interval in milliseconds")
 	msgSizeFlag     = flag.Int("size", 32, "message size in bytes")
 	numMsgsFlag     = flag.Int("n", 1, "number of messages published at the same time")
+	traceFlag       = flag.String("trace", "", "write the events to this file as a structured JSONL trace instead of logging them")
+	peersFlag       = flag.String("peers", "", "connect to the peers of this peer table instead of discovering them randomly")
+	verbosityFlag   = flag.Int("verbosity", traceControlRPCs, "0 traces the message events, 1 also the messages in RPCs, 2 also the control messages")
+	summaryFlag     = flag.String("summary", "", "keep the headline numbers of the node in memory and write them to this file")
+	summaryAtFlag   = flag.Duration("summary-at", 4*time.Minute+50*time.Second, "simulated time of the day the summary is written at, before the stop time")
 )
 
 // creates a custom gossipsub parameter set.
@@ -81,11 +89,50 @@ func nodePrivKey(id int) crypto.PrivKey {
 	return privkey
 }
 
+// connectNode connects to node id at the ip address and returns its address.
+// The peer id is derived from the node id if it's empty.
+func connectNode(ctx context.Context, h host.Host, id int, ip string, peerId string) (string, error) {
+	if peerId == "" {
+		pid, err := peer.IDFromPrivateKey(nodePrivKey(id))
+		if err != nil {
+			return "", err
+		}
+		peerId = pid.String()
+	}
+
+	// craft an addr info to be used to connect
+	addr := fmt.Sprintf("/ip4/%s/tcp/9000/p2p/%s", ip, peerId)
+	info, err := peer.AddrInfoFromString(addr)
+	if err != nil {
+		return addr, err
+	}
+	return addr, h.Connect(ctx, *info)
+}
+
 func main() {
-	log.SetOutput(os.Stdout)
+	logs := newAsyncWriter(os.Stdout, 1<<16, time.Second)
+	log.SetOutput(logs)
 	log.SetFlags(log.LstdFlags | log.Lmicroseconds)
 
+	// write out the queued logs and traces when main returns or panics, and
+	// when shadow stops the node with a SIGTERM at its shutdown_time
+	flushLogs := func() {
+		if structuredTrace != nil {
+			structuredTrace.out.Flush()
+		}
+		logs.Flush()
+	}
+	defer flushLogs()
+	signals := make(chan os.Signal, 1)
+	signal.Notify(signals, syscall.SIGTERM, os.Interrupt)
+	go func() {
+		<-signals
+		flushLogs()
+		os.Exit(0)
+	}()
+
 	flag.Parse()
+	traceVerbosity = *verbosityFlag
 	ctx := context.Background()
 
 	hostname, err := os.Hostname()
@@ -103,6 +150,13 @@ func main() {
 	}
 	log.Printf("NodeId: %d\n", nodeId)
 
+	if *traceFlag != "" {
+		structuredTrace, err = newTraceWriter(*traceFlag, time.Second)
+		if err != nil {
+			panic(err)
+		}
+	}
+
 	// listen for incoming connections
 	h, err := libp2p.New(
 		libp2p.ListenAddrStrings("/ip4/0.0.0.0/tcp/9000"),
@@ -112,8 +166,22 @@ func main() {
 		panic(err)
 	}
 	log.Printf("PeerId: %s\n", h.ID())
+	if structuredTrace != nil {
+		structuredTrace.event("identity", h.ID(), "", "")
+	}
 	log.Printf("Listening on: %v\n", h.Addrs())
 
+	if *summaryFlag != "" {
+		summary = newNodeSummary(nodeId, h.ID().String(), *isMaliciousFlag)
+		// the simulation starts at 2000/01/01 00:00:00
+		at := time.Date(2000, time.January, 1, 0, 0, 0, 0, time.UTC).Add(*summaryAtFlag)
+		time.AfterFunc(time.Until(at), func() {
+			if err := summary.write(*summaryFlag); err != nil {
+				log.Printf("Failed writing the summary: %v\n", err)
+			}
+		})
+	}
+
 	// create a gossipsub node and subscribe to the topic
 	psOpts := pubsubOptions(*isMaliciousFlag)
 	ps, err := pubsub.NewGossipSub(ctx, h, psOpts...)
@@ -132,9 +200,25 @@ func main() {
 	// wait 30 seconds for other nodes to bootstrap
 	time.Sleep(30 * time.Second)
 
-	// discover peers
+	// connect to the peers of the peer table, or discover them randomly if
+	// there is none
+	var table []peerEntry
+	if *peersFlag != "" {
+		table, err = loadPeerTable(*peersFlag, nodeId)
+		if err != nil {
+			log.Printf("Failed loading the peer table, discovering peers randomly: %v\n", err)
+		}
+	}
+	for _, entry := range table {
+		if addr, err := connectNode(ctx, h, entry.id, entry.ip, entry.peerId); err != nil {
+			log.Printf("Failed connecting to node%d: %v\n", entry.id, err)
+		} else {
+			log.Printf("Connected to node%d: %s\n", entry.id, addr)
+		}
+	}
+
 	peers := make(map[int]struct{})
-	for len(h.Network().Peers()) < *targetFlag {
+	for table == nil && len(h.Network().Peers()) < *targetFlag {
 		// do node discovery by picking the node randomly
 		id := rand.Intn(*countFlag)
 		if _, ok := peers[id]; ok || id == nodeId {
@@ -148,19 +232,9 @@ func main() {
 			continue
 		}
 
-		// craft an addr info to be used to connect
-		peerId, err := peer.IDFromPrivateKey(nodePrivKey(id))
-		if err != nil {
-			panic(err)
-		}
-		addr := fmt.Sprintf("/ip4/%s/tcp/9000/p2p/%s", addrs[0], peerId)
-		info, err := peer.AddrInfoFromString(addr)
-		if err != nil {
-			panic(err)
-		}
-
 		// connect to the peer
-		if err = h.Connect(ctx, *info); err != nil {
+		addr, err := connectNode(ctx, h, id, addrs[0], "")
+		if err != nil {
 			log.Printf("Failed connecting to node%d: %v\n", id, err)
 			continue
 		}
@@ -178,6 +252,13 @@ func main() {
 			rand.Read(msg) // it takes about a 50-100 us to fill the buffer on macpro 2019. Can be considered simulataneous
 			if err := topic.Publish(ctx, msg); err != nil {
 				log.Printf("Failed to publish message by %s\n", h.ID())
+				continue
+			}
+			if summary != nil {
+				summary.published(CalcID(msg))
+			}
+			if structuredTrace != nil {
+				structuredTrace.event("published", "", CalcID(msg), topicName)
 			} else {
 				log.Printf("Published: (topic: %s, id: %s)\n", topicName, CalcID(msg))
 			}
@@ -190,6 +271,10 @@ func main() {
 		if err != nil {
 			panic(err)
 		}
+		if structuredTrace != nil {
+			structuredTrace.event("received", m.ReceivedFrom, CalcID(m.Message.Data), *m.Topic)
+			continue
+		}
 		log.Printf("Received: (topic: %s, id: %s)\n", *m.Topic, CalcID(m.Message.Data))
 	}
 
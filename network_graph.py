@@ -1,7 +1,8 @@
-# usage: python network_graph.py [node-count]
+# usage: python network_graph.py [node-count] [target-conn] [msg-size] [num-msgs] [D] [D-announce] [interval] [malicious-percent] [text|jsonl|summary] [seed] [verbosity]
 from dataclasses import dataclass
-import random
+import os
 import networkx as nx
+import numpy as np
 import sys
 import yaml
 
@@ -117,6 +118,40 @@ edges = [
     Edge(west_asia, west_asia, 5),
 ]
 
+# the peer ids are derived as in nodePrivKey in main.go, which needs the
+# optional cryptography package. Without it the ids are left out of the peer
+# table and the nodes derive them themselves.
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+except ImportError:
+    Ed25519PrivateKey = None
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def peer_id(i):
+    if Ed25519PrivateKey is None:
+        return "-"
+    seed = i.to_bytes(8, "little") + bytes(24)
+    public_key = Ed25519PrivateKey.from_private_bytes(seed).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    # an identity multihash of the protobuf encoded ed25519 public key
+    multihash = bytes([0x00, 0x24, 0x08, 0x01, 0x12, 0x20]) + public_key
+    n = int.from_bytes(multihash, "big")
+    digits = []
+    while n:
+        n, r = divmod(n, 58)
+        digits.append(B58_ALPHABET[r])
+    # base58 writes every leading zero byte as a 1
+    zeros = len(multihash) - len(multihash.lstrip(b"\x00"))
+    return B58_ALPHABET[0] * zeros + "".join(reversed(digits))
+
+
+def host_ip(i):
+    # 11.x.y.z without any 0 or 255 byte, for up to 250^3 hosts
+    return f"11.{i // 62500 + 1}.{i // 250 % 250 + 1}.{i % 250 + 1}"
+
+
 node_count = int(sys.argv[1])
 target_conn = int(sys.argv[2])
 msg_size = int(sys.argv[3])
@@ -125,6 +160,16 @@ d_mesh = int(sys.argv[5])
 d_announce = int(sys.argv[6])
 interval = int(sys.argv[7])
 num_malicious = int(sys.argv[8])
+# "jsonl" makes the nodes write a structured trace instead of the event logs,
+# "summary" also a summary of their metrics that analyse_logs.py --summaries
+# reads instead of the logs
+trace_format = sys.argv[9] if len(sys.argv) > 9 else "text"
+# the same seed gives the same hosts, a random one is picked if none is given
+seed = int(sys.argv[10]) if len(sys.argv) > 10 else int(np.random.SeedSequence().entropy % 2**32)
+print(f"seed: {seed}")
+# 0 traces the message events, 1 also the messages sent and received in RPCs
+# and 2, the default, also the control messages
+verbosity = int(sys.argv[11]) if len(sys.argv) > 11 else 2
 
 ids = {}
 for node_type in node_types:
@@ -145,29 +190,79 @@ with open("graph.gml", "w") as file:
     file.write("\n".join(nx.generate_gml(G)))
     file.close
 
-with open("shadow.template.yaml", "r") as file:
+# the template is next to this script, the generated files go to the working
+# directory so that several simulations can be set up side by side
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "shadow.template.yaml"), "r") as file:
     config = yaml.safe_load(file)
 
 config["network"] = {"graph": {"type": "gml", "file": {"path": "graph.gml"}}}
 
-config["hosts"] = {}
-for i in range(node_count):
-    location = random.choices(locations, map(lambda lc: lc.weight, locations))[0]
-    is_malicious = ""
-    if i == 0:
-        node_type = supernode
-    else:
-        is_malicious = "-malicious" if random.randint(1, 100) <= num_malicious else "" 
-        node_type = random.choices(node_types, map(lambda nt: nt.weight, node_types))[0]
-
-    config["hosts"][f"node{i}"] = {
-        "network_node_id": ids[f"{location.name}-{node_type.name}"],
-        "processes": [{
-            "args": f"-count {node_count} -target {target_conn} -n {num_msgs} -size {msg_size} -D {d_mesh} -Dannounce {d_announce} -interval {interval} {is_malicious}",
-            "expected_final_state": "running",
-            "path": "./pubsub-shadow",
-        }],
-    }
+# the hosts are sampled all at once, node0 is always an honest supernode
+rng = np.random.default_rng(seed)
+location_weights = np.array([lc.weight for lc in locations], dtype=float)
+node_type_weights = np.array([nt.weight for nt in node_types], dtype=float)
+host_locations = rng.choice(len(locations), size=node_count, p=location_weights / location_weights.sum())
+host_types = rng.choice(len(node_types), size=node_count, p=node_type_weights / node_type_weights.sum())
+host_malicious = rng.integers(1, 101, size=node_count) <= num_malicious
+host_types[0] = node_types.index(supernode)
+host_malicious[0] = False
+# the index of "{location}-{node type}" in ids
+network_node_ids = host_types * len(locations) + host_locations
+
+# the peers every node connects to, picked the way the nodes used to discover
+# them: in turn, every node dials random peers until it has target_conn
+# connections, counting the ones dialed by the nodes before it
+dialed = [[] for _ in range(node_count)]
+connected = [set() for _ in range(node_count)]
+for i in rng.permutation(node_count).tolist():
+    while len(connected[i]) < min(target_conn, node_count - 1):
+        for j in rng.integers(node_count, size=target_conn).tolist():
+            if len(connected[i]) >= target_conn:
+                break
+            if j != i and j not in connected[i]:
+                dialed[i].append(j)
+                connected[i].add(j)
+                connected[j].add(i)
+
+# the peer table, one line per node:
+#   <node id> <ip address> <peer id or -> <node ids it dials, comma separated, or ->
+# main.go reads it with -peers instead of resolving and deriving the ids of
+# random nodes
+with open("peers.txt", "w") as file:
+    for i in range(node_count):
+        file.write(f"{i} {host_ip(i)} {peer_id(i)} {','.join(map(str, dialed[i])) or '-'}\n")
 
+trace = ""
+if trace_format == "jsonl":
+    trace = "-trace pubsub-shadow.trace.jsonl"
+elif trace_format == "summary":
+    trace = "-summary pubsub-shadow.summary.json"
+args = f"-count {node_count} -target {target_conn} -n {num_msgs} -size {msg_size} -D {d_mesh} -Dannounce {d_announce} -interval {interval} -verbosity {verbosity} -peers {os.path.abspath('peers.txt')}"
+host_args = [f"'{args}  {trace}'", f"'{args} -malicious {trace}'"]
+
+# the nodes are sent a SIGTERM a second before the stop time of the template,
+# on which they flush their logs and exit
+shutdown_time = "299 s"
+
+# yaml.dump is far too slow for 100k hosts, so the hosts, which all look
+# the same, are written directly
 with open("shadow.yaml", "w") as file:
-    yaml.dump(config, file)
+    yaml.dump(config, file, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper))
+    file.write("hosts:\n")
+    for i, (network_node_id, malicious) in enumerate(zip(network_node_ids.tolist(), host_malicious.tolist())):
+        file.write(
+            f"  node{i}:\n"
+            f"    ip_addr: {host_ip(i)}\n"
+            f"    network_node_id: {network_node_id}\n"
+            f"    processes:\n"
+            f"    - args: {host_args[malicious]}\n"
+            f"      shutdown_time: {shutdown_time}\n"
+            f"      expected_final_state: {{exited: 0}}\n"
+            f"      path: ./pubsub-shadow\n"
+        )
+
+# which host is where, to be joined with the results without parsing shadow.yaml
+with open("hosts.csv", "w") as file:
+    file.write("node,location,node_type,malicious,network_node_id\n")
+    for i, (location, node_type, malicious, network_node_id) in enumerate(zip(host_locations.tolist(), host_types.tolist(), host_malicious.tolist(), network_node_ids.tolist())):
+        file.write(f"{i},{locations[location].name},{node_types[node_type].name},{int(malicious)},{network_node_id}\n")
@@ -0,0 +1,110 @@
+package main
+
+import (
+	"bufio"
+	"fmt"
+	"os"
+	"strconv"
+	"strings"
+)
+
+// peerEntry is a node the node connects to, from the peer table written by
+// network_graph.py. Every line of the table is
+//
+//	<node id> <ip address> <peer id or -> <node ids it dials, comma separated, or ->
+type peerEntry struct {
+	id     int
+	ip     string
+	peerId string // empty if it has to be derived with nodePrivKey
+}
+
+// loadPeerTable returns the nodes that node id dials, in the order of the
+// table. The table is read twice, once for the line of the node and once for
+// the lines of its peers, so that the whole table is never kept in memory.
+func loadPeerTable(path string, id int) ([]peerEntry, error) {
+	var dialed []int
+	found := false
+	err := scanPeerTable(path, func(fields []string) (bool, error) {
+		if fields[0] != strconv.Itoa(id) {
+			return true, nil
+		}
+		found = true
+		if fields[3] == "-" {
+			return false, nil
+		}
+		for _, s := range strings.Split(fields[3], ",") {
+			peer, err := strconv.Atoi(s)
+			if err != nil {
+				return false, err
+			}
+			dialed = append(dialed, peer)
+		}
+		return false, nil
+	})
+	if err != nil {
+		return nil, err
+	}
+	if !found {
+		return nil, fmt.Errorf("node%d is not in the peer table", id)
+	}
+
+	if len(dialed) == 0 {
+		return []peerEntry{}, nil
+	}
+
+	wanted := make(map[int]int, len(dialed))
+	for i, peer := range dialed {
+		wanted[peer] = i
+	}
+	entries := make([]peerEntry, len(dialed))
+	remaining := len(dialed)
+	err = scanPeerTable(path, func(fields []string) (bool, error) {
+		peer, err := strconv.Atoi(fields[0])
+		if err != nil {
+			return false, err
+		}
+		i, ok := wanted[peer]
+		if !ok {
+			return true, nil
+		}
+		entries[i] = peerEntry{id: peer, ip: fields[1]}
+		if fields[2] != "-" {
+			entries[i].peerId = fields[2]
+		}
+		remaining--
+		return remaining > 0, nil
+	})
+	if err != nil {
+		return nil, err
+	}
+	if remaining > 0 {
+		return nil, fmt.Errorf("%d peers of node%d are not in the peer table", remaining, id)
+	}
+	return entries, nil
+}
+
+// scanPeerTable calls f with the fields of every line until f returns false.
+func scanPeerTable(path string, f func(fields []string) (bool, error)) error {
+	file, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer file.Close()
+
+	scanner := bufio.NewScanner(bufio.NewReaderSize(file, 1<<16))
+	scanner.Buffer(make([]byte, 1<<16), 1<<24)
+	for scanner.Scan() {
+		fields := strings.Fields(scanner.Text())
+		if len(fields) != 4 {
+			return fmt.Errorf("malformed peer table line: %q", scanner.Text())
+		}
+		more, err := f(fields)
+		if err != nil {
+			return err
+		}
+		if !more {
+			return nil
+		}
+	}
+	return scanner.Err()
+}
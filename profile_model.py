@@ -0,0 +1,93 @@
+# usage: python profile_model.py [profile.csv] [--nodes N ...] [--msg-size BYTES] [--num-msgs N] [--announce D] [--malicious PERCENT]
+#
+# Fits how the cost of a run scales with the profile table of sweep.py, to
+# size a machine before scheduling a bigger run. Every cost (wall time, peak
+# RSS, log volume) is fitted as a power law of the number of nodes, the
+# message size and the number of messages, times an exponential of Dannounce
+# and the percent of malicious nodes, by least squares on the logs:
+#
+#   log(cost) = c + a log(nodes) + b log(msg size) + d log(num msgs) + e announce + f malicious
+#
+# A parameter that is the same in every run of the table can't be fitted and
+# is left out, so the table needs runs with different numbers of nodes (e.g.
+# sweeps with --nodes 250, 500 and 1000) to predict bigger ones.
+import csv
+import argparse
+import numpy as np
+
+COSTS = ["wall_seconds", "peak_rss", "log_bytes"]
+# the terms of the model: the column and whether its log is taken
+TERMS = [("nodes", True), ("msg_size", True), ("num_msgs", True), ("announce", False), ("malicious", False)]
+
+
+def read_profile(path):
+    with open(path, "r") as f:
+        rows = list(csv.DictReader(f))
+    # the runs stopped early didn't simulate the whole time
+    return [row for row in rows if row["stopped_early"] == "False"]
+
+
+def features(columns):
+    return np.stack(
+        [np.log(columns[name]) if log else columns[name] for name, log in TERMS], axis=1
+    )
+
+
+def fit_costs(rows):
+    # the coefficients of every cost, the terms that were fitted and the R²
+    # of the fit
+    columns = {name: np.array([float(row[name]) for row in rows]) for name, _ in TERMS}
+    x = features(columns)
+    fitted = [i for i in range(len(TERMS)) if np.ptp(x[:, i]) > 0]
+    design = np.column_stack([np.ones(len(rows)), x[:, fitted]])
+    models = {}
+    for cost in COSTS:
+        y = np.log(np.maximum([float(row[cost]) for row in rows], 1e-9))
+        coefs, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+        residual = y - design @ coefs
+        total = ((y - y.mean()) ** 2).sum()
+        r2 = 1 - (residual**2).sum() / total if total > 0 else 1.0
+        models[cost] = (coefs, r2)
+    return models, fitted
+
+
+def predict(models, fitted, params):
+    x = features({name: np.array([float(params[name])]) for name, _ in TERMS})[:, fitted]
+    design = np.column_stack([np.ones(1), x])
+    return {cost: float(np.exp(design @ coefs)[0]) for cost, (coefs, _) in models.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("profile", nargs="?", default="profile.csv")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[5000, 10000])
+    parser.add_argument("--msg-size", type=int, default=128 * 1024)
+    parser.add_argument("--num-msgs", type=int, default=16)
+    parser.add_argument("--announce", type=int, default=8)
+    parser.add_argument("--malicious", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = read_profile(args.profile)
+    models, fitted = fit_costs(rows)
+    names = [name for name, _ in TERMS]
+    print(f"{len(rows)} runs, fitted on {', '.join(names[i] for i in fitted) or 'nothing'}")
+    if 0 not in fitted:
+        print("every run has the same number of nodes, the node count can't be predicted")
+    for cost, (coefs, r2) in models.items():
+        terms = " ".join(f"{names[i]}:{coef:+.3f}" for i, coef in zip(fitted, coefs[1:]))
+        print(f"{cost:>14}: R²={r2:.3f} {terms}")
+
+    print()
+    for nodes in args.nodes:
+        params = {
+            "nodes": nodes,
+            "msg_size": args.msg_size,
+            "num_msgs": args.num_msgs,
+            "announce": args.announce,
+            "malicious": args.malicious,
+        }
+        costs = predict(models, fitted, params)
+        print(
+            f"{nodes} nodes: {costs['wall_seconds'] / 3600:.2f}h wall,"
+            f" {costs['peak_rss'] / 1e9:.1f}GB peak RSS, {costs['log_bytes'] / 1e9:.1f}GB of logs"
+        )
@@ -0,0 +1,81 @@
+# usage: python query_events.py [scenario] msg [msg-id]
+#        python query_events.py [scenario] link [node-id] [node-id]
+#
+# Prints the events of one message across all the nodes of a scenario, or the
+# events between two nodes, sorted by time, from the indexes of the parsed
+# scenarios that analyse_logs.py caches (see timeline_store.py). Only the
+# events asked for are read, not the whole scenario. A message id can be
+# shortened to any prefix that is unique in the scenario.
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+import timeline_store
+
+
+def find_msg(msgs, prefix):
+    matches = [msg for msg, msg_id in enumerate(msgs) if msg_id.startswith(prefix)]
+    if len(matches) != 1:
+        raise Exception(f"{len(matches)} messages start with {prefix}")
+    return matches[0]
+
+
+def format_events(events, meta, path):
+    # the lines to print: time, node, event, peer (as its node if it is one)
+    # and message
+    kinds = list(timeline_store.EVENT_FIELDS)
+    node_of_peer = {
+        int(p): meta["nodes"][int(n)]
+        for n, p in zip(
+            np.load(os.path.join(path, "identity.node.npy")),
+            np.load(os.path.join(path, "identity.peer.npy")),
+        )
+    }
+    lines = []
+    for time, node, kind, peer, msg in zip(
+        events["time"].tolist(),
+        events["node"].tolist(),
+        events["kind"].tolist(),
+        events["peer"].tolist(),
+        events["msg"].tolist(),
+    ):
+        if peer < 0:
+            peer_name = "-"
+        elif peer in node_of_peer:
+            peer_name = f"node{node_of_peer[peer]}"
+        else:
+            peer_name = meta["peers"][peer]
+        lines.append(
+            # the times are read in UTC, so they print as in the logs
+            f"{datetime.fromtimestamp(time, tz=timezone.utc):%Y/%m/%d %H:%M:%S.%f}"
+            f" node{meta['nodes'][node]}"
+            f" {kinds[kind]} {peer_name} {meta['msgs'][msg] if msg >= 0 else '-'}"
+        )
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenario", help="e.g. 128-0-1 or malicious-10-8")
+    parser.add_argument("query", choices=["msg", "link"])
+    parser.add_argument("values", nargs="+", help="a message id, or two node ids")
+    parser.add_argument("--cache", default="analysed_timeline.tln", help="the cache of analyse_logs.py")
+    args = parser.parse_args()
+
+    path = os.path.join(args.cache, args.scenario)
+    meta = timeline_store.read_meta(path)
+    if args.query == "msg":
+        events = timeline_store.query_msg(path, find_msg(meta["msgs"], args.values[0]))
+    else:
+        if len(args.values) != 2:
+            parser.error("link takes two node ids")
+        nodes = {node_id: node for node, node_id in enumerate(meta["nodes"])}
+        for node_id in args.values:
+            if node_id not in nodes:
+                parser.error(f"there is no node {node_id} in {args.scenario}")
+        events = timeline_store.query_link(path, nodes[args.values[0]], nodes[args.values[1]])
+
+    sys.stdout.writelines(line + "\n" for line in format_events(events, meta, path))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# usage: python stub_shadow.py [shadow options] -d [data-dir] [shadow-yaml]
+#
+# Stands in for shadow to try sweep.py without a big machine. It doesn't run
+# anything, it writes synthetic logs (see synthetic_logs.py) for the hosts of
+# the config.
+import os
+import sys
+import zlib
+import argparse
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_logs import generate_logs
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-d", "--data-directory", default="shadow.data")
+parser.add_argument("-p", "--parallelism")
+parser.add_argument("--progress")
+parser.add_argument("config")
+args, _ = parser.parse_known_args()
+
+with open(args.config, "r") as file:
+    text = file.read()
+config = yaml.safe_load(text)
+# the same config, e.g. the same network_graph.py seed, gives the same logs
+seed = zlib.crc32(text.encode())
+
+malicious = []
+for host, options in config["hosts"].items():
+    argv = options["processes"][0]["args"].split()
+    if "-malicious" in argv:
+        malicious.append(int(host[len("node"):]))
+
+count = int(argv[argv.index("-count") + 1])
+num_msgs = int(argv[argv.index("-n") + 1])
+d_mesh = int(argv[argv.index("-D") + 1])
+d_announce = int(argv[argv.index("-Dannounce") + 1])
+msg_size = int(argv[argv.index("-size") + 1])
+generate_logs(
+    args.data_directory,
+    count,
+    num_msgs,
+    malicious=malicious,
+    seed=seed,
+    d_mesh=d_mesh,
+    d_announce=d_announce,
+    summaries="-summary" in argv,
+    msg_size=msg_size,
+)
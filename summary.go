@@ -0,0 +1,130 @@
+package main
+
+import (
+	"encoding/json"
+	"os"
+	"sync"
+	"time"
+
+	pubsub "github.com/libp2p/go-libp2p-pubsub"
+	pb "github.com/libp2p/go-libp2p-pubsub/pb"
+)
+
+// nodeSummary keeps the headline numbers of the node in memory: when it
+// published and first delivered every message, its duplicates, the message
+// ids it sent and received in every type of control message, and the
+// messages and bytes of its RPCs. It is written once as a JSON file, which
+// analyse_logs.py reads instead of parsing the logs. The times are unix
+// nanoseconds.
+type nodeSummary struct {
+	mu sync.Mutex
+
+	Node            int              `json:"node"`
+	PeerId          string           `json:"peer"`
+	Malicious       bool             `json:"malicious"`
+	Published       map[string]int64 `json:"published"`
+	Delivered       map[string]int64 `json:"delivered"`
+	Duplicates      map[string]int   `json:"duplicates"`
+	ControlSent     map[string]int   `json:"control_sent"`
+	ControlReceived map[string]int   `json:"control_received"`
+	RpcsSent        int              `json:"rpcs_sent"`
+	RpcsReceived    int              `json:"rpcs_received"`
+	BytesSent       int64            `json:"bytes_sent"`
+	BytesReceived   int64            `json:"bytes_received"`
+	WrittenAt       int64            `json:"written_at"`
+}
+
+// summary is set when the node keeps a summary, see -summary.
+var summary *nodeSummary
+
+func newNodeSummary(node int, peerId string, malicious bool) *nodeSummary {
+	return &nodeSummary{
+		Node:            node,
+		PeerId:          peerId,
+		Malicious:       malicious,
+		Published:       make(map[string]int64),
+		Delivered:       make(map[string]int64),
+		Duplicates:      make(map[string]int),
+		ControlSent:     make(map[string]int),
+		ControlReceived: make(map[string]int),
+	}
+}
+
+func (s *nodeSummary) published(id string) {
+	now := time.Now().UnixNano()
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	if _, ok := s.Published[id]; !ok {
+		s.Published[id] = now
+	}
+}
+
+func (s *nodeSummary) delivered(id string) {
+	now := time.Now().UnixNano()
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	if _, ok := s.Delivered[id]; !ok {
+		s.Delivered[id] = now
+	}
+}
+
+func (s *nodeSummary) duplicate(id string) {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	s.Duplicates[id]++
+}
+
+// rpc counts the messages and the control message ids of an RPC the node
+// sent or received, like the rpcs_* and *_sent/*_received events.
+func (s *nodeSummary) rpc(sent bool, data *pb.TraceEvent_RPCMeta) {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	control := s.ControlReceived
+	if sent {
+		s.RpcsSent += len(data.GetMessages())
+		control = s.ControlSent
+	} else {
+		s.RpcsReceived += len(data.GetMessages())
+	}
+
+	controlData := data.GetControl()
+	for _, msg := range controlData.GetIhave() {
+		control["IHAVE"] += len(msg.GetMessageIDs())
+	}
+	for _, msg := range controlData.GetIwant() {
+		control["IWANT"] += len(msg.GetMessageIDs())
+	}
+	for _, msg := range controlData.GetIdontwant() {
+		control["IDONTWANT"] += len(msg.GetMessageIDs())
+	}
+	control["IANNOUNCE"] += len(controlData.GetIannounce())
+	control["INEED"] += len(controlData.GetIneed())
+}
+
+// rpcBytes counts the size of an RPC on the wire, control included.
+func (s *nodeSummary) rpcBytes(sent bool, rpc *pubsub.RPC) {
+	size := int64(rpc.Size())
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	if sent {
+		s.BytesSent += size
+	} else {
+		s.BytesReceived += size
+	}
+}
+
+// write writes the summary to path. It is written to a temporary file first,
+// so that a summary that is there is complete.
+func (s *nodeSummary) write(path string) error {
+	s.mu.Lock()
+	s.WrittenAt = time.Now().UnixNano()
+	data, err := json.Marshal(s)
+	s.mu.Unlock()
+	if err != nil {
+		return err
+	}
+	if err := os.WriteFile(path+".tmp", data, 0644); err != nil {
+		return err
+	}
+	return os.Rename(path+".tmp", path)
+}
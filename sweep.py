@@ -0,0 +1,306 @@
+# usage: python sweep.py [--memory GB] [--cpus N] [--only PATTERN]
+#
+# Runs the simulations of run_sim.sh, several at a time. Every run is set up
+# by network_graph.py in its own directory under --runs, so the runs don't
+# share shadow.yaml or graph.gml. A run holds --memory-per-run GB of RAM and
+# --cpus-per-run cores while shadow runs; as many runs as fit in --memory and
+# --cpus are started at once. The results are compressed in the background
+# into shadow-*.tar.gz (or .tar.zst) in --out, where analyse_logs.py reads
+# them. A run whose archive is already in --out is skipped, so an interrupted
+# sweep is resumed by starting it again. With --stop-early the logs of every
+# run are followed while shadow writes them (see live_logs.py) and shadow is
+# stopped as soon as every node has delivered every message.
+import os
+import re
+import sys
+import glob
+import time
+import random
+import shutil
+import fnmatch
+import argparse
+import datetime
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+REPO_PATH = os.path.dirname(os.path.abspath(__file__))
+NETWORK_GRAPH = os.path.join(REPO_PATH, "network_graph.py")
+
+size_list = [128, 256, 512, 1024, 2048, 4096, 8192]
+num_list = [2, 4, 8, 16, 32, 64]
+malicious_list = [5, 10, 20, 30, 50]
+
+print_lock = threading.Lock()
+
+
+def log(message):
+    with print_lock:
+        print(message, flush=True)
+
+
+def sweep_runs(node_count, target_conn, d_mesh, trace_format, seed=None, verbosity=2, replicates=1):
+    # the (name, network_graph.py arguments) of every run, in run_sim.sh order.
+    # With replicates, every run is repeated with the seeds seed, seed + 1, ...
+    # (0, 1, ... without a seed) as <name>-r0, <name>-r1, ...
+    runs = []
+
+    def add(name, msg_size, num_msgs, d, announce, malicious):
+        interval = 700 if announce == 0 else 1500
+        graph_args = [node_count, target_conn, msg_size, num_msgs, d, announce, interval, malicious, trace_format]
+        if replicates <= 1:
+            runs.append((name, graph_args + [random.randrange(2**32) if seed is None else seed, verbosity]))
+            return
+        for r in range(replicates):
+            runs.append((f"{name}-r{r}", graph_args + [(seed or 0) + r, verbosity]))
+
+    announces = [0, d_mesh - 1, d_mesh]
+    for kb in size_list:
+        for announce in announces:
+            add(f"shadow-{kb}-{announce}-1", kb * 1024, 1, d_mesh, announce, 0)
+    for announce in announces:
+        for num_msgs in num_list:
+            add(f"shadow-128-{announce}-{num_msgs}", 128 * 1024, num_msgs, d_mesh, announce, 0)
+    for announce in announces:
+        for malicious in malicious_list:
+            add(f"shadow-malicious-{malicious}-{announce}", 128 * 1024, 16, 8, announce, malicious)
+    return runs
+
+
+def archive_name(name, codec):
+    return f"{name}.tar.{codec}"
+
+
+def is_done(name, out_dir):
+    return any(
+        os.path.exists(os.path.join(out_dir, archive_name(name, codec)))
+        for codec in ["gz", "zst"]
+    )
+
+
+def run_simulation(name, graph_args, args):
+    run_dir = os.path.join(args.runs, name)
+    # whatever is left of an interrupted run is started over
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    os.symlink(os.path.abspath(args.binary), os.path.join(run_dir, "pubsub-shadow"))
+
+    subprocess.run(
+        [sys.executable, NETWORK_GRAPH] + [str(arg) for arg in graph_args],
+        cwd=run_dir,
+        check=True,
+    )
+    command = (
+        args.shadow.split()
+        + ["--progress", "true", "--parallelism", str(args.cpus_per_run)]
+        + ["-d", f"{name}.data", "shadow.yaml"]
+    )
+    data_dir = os.path.join(run_dir, f"{name}.data")
+    start = time.monotonic()
+    with open(os.path.join(run_dir, "shadow.log"), "w") as file:
+        shadow = subprocess.Popen(command, cwd=run_dir, stdout=file, stderr=subprocess.STDOUT)
+        # shadow is only reaped by wait4 below, for its resource usage
+        running = lambda: os.waitid(os.P_PID, shadow.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None
+        stopped_at = None
+        if args.stop_early:
+            # shadow is stopped once the logs show every message delivered.
+            # live_logs imports the parser, which the other runs don't need
+            import live_logs
+
+            count, num_msgs = graph_args[0], graph_args[3]
+            trace = args.trace == "jsonl"
+            for summary in live_logs.watch(data_dir, count, num_msgs, running, args.every, trace=trace):
+                log(f"{name}: {live_logs.format_summary(summary)}")
+                if summary["complete"] and running():
+                    shadow.terminate()
+                    stopped_at = summary["last_time"]
+        _, status, usage = os.wait4(shadow.pid, 0)
+        shadow.returncode = os.waitstatus_to_exitcode(status)
+        if shadow.returncode != 0 and stopped_at is None:
+            raise subprocess.CalledProcessError(shadow.returncode, command)
+    wall_seconds = time.monotonic() - start
+
+    # the simulated time is the stop time of the config, or the time of the
+    # last delivery if the run was stopped early. The logs start at
+    # 2000/01/01 00:00:00 and are read as UTC times, like analyse_logs.py.
+    with open(os.path.join(run_dir, "shadow.yaml"), "r") as file:
+        sim_seconds = parse_duration(yaml.safe_load(file)["general"]["stop_time"])
+    if stopped_at is not None:
+        epoch = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+        sim_seconds = stopped_at - epoch.timestamp()
+    log_bytes = sum(
+        os.path.getsize(os.path.join(folder, filename))
+        for folder, _, filenames in os.walk(os.path.join(data_dir, "hosts"))
+        for filename in filenames
+    )
+    nodes, _, msg_size, num_msgs, _, announce, _, malicious = graph_args[:8]
+    record_profile(
+        args.profile,
+        {
+            "name": name,
+            "nodes": nodes,
+            "msg_size": msg_size,
+            "num_msgs": num_msgs,
+            "announce": announce,
+            "malicious": malicious,
+            "parallelism": args.cpus_per_run,
+            "wall_seconds": f"{wall_seconds:.3f}",
+            "sim_seconds": f"{sim_seconds:.3f}",
+            "sim_per_wall": f"{sim_seconds / wall_seconds:.4f}",
+            "user_seconds": f"{usage.ru_utime:.3f}",
+            "sys_seconds": f"{usage.ru_stime:.3f}",
+            # ru_maxrss is in KB on Linux
+            "peak_rss": usage.ru_maxrss * 1024,
+            "log_bytes": log_bytes,
+            "log_bytes_per_node": log_bytes // max(1, nodes),
+            "stopped_early": stopped_at is not None,
+        },
+    )
+
+    # the host manifest goes into the archive with the logs
+    shutil.copy(os.path.join(run_dir, "hosts.csv"), data_dir)
+    return run_dir
+
+
+def parse_duration(value):
+    # a shadow duration like "5 min", "300s" or 300, in seconds
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-z]*)\s*", str(value))
+    unit = match.group(2)
+    if unit.startswith("ms") or unit.startswith("milli"):
+        return float(match.group(1)) / 1000
+    scale = {"m": 60, "h": 3600}.get(unit[:1], 1)
+    return float(match.group(1)) * scale
+
+
+def record_profile(path, row):
+    # appends a row to the profile table, with the header if it is new
+    with print_lock:
+        is_new = not os.path.exists(path)
+        with open(path, "a") as file:
+            if is_new:
+                file.write(",".join(row) + "\n")
+            file.write(",".join(str(value) for value in row.values()) + "\n")
+
+
+def compress_run(name, run_dir, args):
+    archive = archive_name(name, args.codec)
+    compress = ["-z"] if args.codec == "gz" else ["--zstd"]
+    subprocess.run(
+        ["tar"] + compress + ["-cf", archive, f"{name}.data"], cwd=run_dir, check=True
+    )
+    # the archive only gets its name in --out once it's complete, so a
+    # half-written one isn't taken for a finished run
+    partial = os.path.join(args.out, f".{archive}.partial")
+    shutil.move(os.path.join(run_dir, archive), partial)
+    os.replace(partial, os.path.join(args.out, archive))
+    shutil.rmtree(run_dir)
+
+
+def sweep(runs, args):
+    failed = []
+
+    def fail(name, err):
+        log(f"{name} failed: {err}")
+        failed.append(name)
+
+    def compress_task(name, run_dir):
+        try:
+            compress_run(name, run_dir, args)
+            log(f"{name} done")
+        except Exception as err:
+            fail(name, err)
+
+    def simulation_task(name, graph_args):
+        log(f"{name} started")
+        try:
+            run_dir = run_simulation(name, graph_args, args)
+        except Exception as err:
+            fail(name, err)
+            return
+        log(f"{name} simulated, compressing")
+        compressor.submit(compress_task, name, run_dir)
+
+    with ThreadPoolExecutor(args.compress_jobs) as compressor:
+        with ThreadPoolExecutor(args.parallel) as simulator:
+            for name, graph_args in runs:
+                simulator.submit(simulation_task, name, graph_args)
+
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memory", type=float, default=300, help="GB of RAM for all the runs")
+    parser.add_argument("--memory-per-run", type=float, default=300, help="GB of RAM one run needs")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="cores for all the runs")
+    parser.add_argument("--cpus-per-run", type=int, default=None, help="shadow --parallelism of a run")
+    parser.add_argument("--compress-jobs", type=int, default=2, help="archives compressed at once")
+    parser.add_argument("--codec", choices=["gz", "zst"], default="gz")
+    parser.add_argument("--runs", default="runs", help="directory of the run directories")
+    parser.add_argument("--out", default=".", help="directory of the archives")
+    parser.add_argument("--shadow", default="shadow", help="shadow command, e.g. ./stub_shadow.py")
+    parser.add_argument("--binary", default=os.path.join(REPO_PATH, "pubsub-shadow"))
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--target", type=int, default=35)
+    parser.add_argument("-D", type=int, default=8)
+    parser.add_argument("--trace", choices=["text", "jsonl", "summary"], default="text")
+    parser.add_argument("--seed", type=int, help="seed of the hosts of every run, random by default")
+    parser.add_argument("--replicates", type=int, default=1, help="runs of every scenario, with consecutive seeds")
+    parser.add_argument(
+        "--verbosity",
+        type=int,
+        choices=[0, 1, 2],
+        default=2,
+        help="0 traces the message events, 1 also the messages in RPCs, 2 also the control messages",
+    )
+    parser.add_argument(
+        "--stop-early",
+        action="store_true",
+        help="follow the logs of every run and stop shadow once every message is delivered",
+    )
+    parser.add_argument("--every", type=float, default=60.0, help="seconds between two progress lines with --stop-early")
+    parser.add_argument(
+        "--profile",
+        help="table the time, peak RSS and log volume of every run are appended to, profile.csv in --out by default",
+    )
+    parser.add_argument("--only", default="*", help="only the runs whose name matches")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    if args.stop_early and args.trace == "summary":
+        # shadow would be stopped before the nodes write their summaries
+        parser.error("--stop-early can't be used with --trace summary")
+
+    slots = int(args.memory // args.memory_per_run)
+    if args.cpus_per_run is None:
+        args.cpus_per_run = max(1, args.cpus // max(1, slots))
+    args.parallel = min(slots, args.cpus // args.cpus_per_run)
+    if args.profile is None:
+        args.profile = os.path.join(args.out, "profile.csv")
+    if args.parallel < 1:
+        raise Exception("the budget doesn't fit a single run")
+
+    runs = [
+        (name, graph_args)
+        for name, graph_args in sweep_runs(
+            args.nodes, args.target, args.D, args.trace, args.seed, args.verbosity, args.replicates
+        )
+        if fnmatch.fnmatch(name, args.only)
+    ]
+    todo = [(name, graph_args) for name, graph_args in runs if not is_done(name, args.out)]
+    print(f"{len(runs) - len(todo)} runs are done, running {len(todo)} at most {args.parallel} at a time")
+    if args.dry_run:
+        for name, graph_args in todo:
+            print(name, *graph_args)
+        sys.exit(0)
+
+    os.makedirs(args.runs, exist_ok=True)
+    os.makedirs(args.out, exist_ok=True)
+    for partial in glob.glob(os.path.join(args.out, ".*.partial")):
+        os.remove(partial)
+
+    failed = sweep(todo, args)
+    if failed:
+        print(f"{len(failed)} runs failed: {' '.join(failed)}")
+        sys.exit(1)
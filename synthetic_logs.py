@@ -0,0 +1,289 @@
+# usage: python synthetic_logs.py [folder] [node-count] [num-msgs] [ihave-fanout] [malicious-percent] [D-announce]
+#
+# Writes a <folder>/hosts/node<i>/pubsub-shadow.1000.stdout tree that looks
+# like the one of a simulation, in the line formats of main.go and tracer.go,
+# without running one. node0 publishes the messages, which spread over a
+# random mesh of degree D. A node announces the messages to D-announce of its
+# mesh peers, which send an INEED to get them, and sends them to the others.
+# Malicious nodes ignore the INEEDs. Every node gossips IHAVEs to `fanout`
+# peers outside of its mesh at every heartbeat, which answer with an IWANT if
+# they don't have the message yet.
+import os
+import sys
+import json
+import heapq
+import base64
+import random
+import hashlib
+import datetime
+
+TOPIC = "foobar"
+PROTOCOL = "/meshsub/1.2.0"
+HEARTBEAT = 0.7
+# how long a node waits after an IANNOUNCE before sending an INEED
+ANNOUNCE_WAIT = 0.005
+START = datetime.datetime(2000, 1, 1, 0, 2)
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def peer_id(i):
+    n = int.from_bytes(hashlib.sha256(f"node{i}".encode()).digest(), "big")
+    digits = []
+    while n:
+        n, r = divmod(n, 58)
+        digits.append(B58_ALPHABET[r])
+    return "12D3KooW" + "".join(reversed(digits))[:44]
+
+
+def msg_id(i):
+    # CalcID in main.go
+    return base64.urlsafe_b64encode(hashlib.sha256(f"msg{i}".encode()).digest()).decode()
+
+
+def sample_malicious(count, percent, rng):
+    # the same draw as network_graph.py, node0 is never malicious
+    return {i for i in range(1, count) if rng.randint(1, 100) <= percent}
+
+
+def random_mesh(count, d_mesh, rng):
+    # every node grafts d_mesh / 2 peers, so that a node has d_mesh peers on
+    # average once the grafts of the others are counted
+    mesh = [set() for _ in range(count)]
+    for i in range(count):
+        grafts = set()
+        while len(grafts) < d_mesh // 2 and len(grafts) < count - 1:
+            j = rng.randrange(count)
+            if j != i:
+                grafts.add(j)
+                mesh[i].add(j)
+                mesh[j].add(i)
+    return mesh
+
+
+def arrival_times(mesh, announce_to, gossip, latency, malicious, published, rng):
+    # how every node first gets a message published by node0: a list of
+    # (time, sender, path, time the sender started, one-way latency) per node,
+    # None if it never does. The path is "push" for a mesh peer sending the
+    # message, "announce" for IANNOUNCE -> INEED -> Publish and "ihave" for
+    # IHAVE -> IWANT -> Publish. Malicious nodes ignore INEEDs.
+    arrival = [None] * len(mesh)
+    heap = [(published, 0, -1, "publish", published, 0.0)]
+    while heap:
+        t, i, sender, path, started, one_way = heapq.heappop(heap)
+        if arrival[i] is not None:
+            continue
+        arrival[i] = (t, sender, path, started, one_way)
+        for j in mesh[i]:
+            if arrival[j] is not None:
+                continue
+            one_way = (latency[i] + latency[j]) * rng.uniform(1.0, 1.2)
+            if j not in announce_to[i]:
+                heapq.heappush(heap, (t + one_way, j, i, "push", t, one_way))
+            elif i not in malicious:
+                heapq.heappush(heap, (t + 3 * one_way + ANNOUNCE_WAIT, j, i, "announce", t, one_way))
+        beat = heartbeat_after(t)
+        for j in gossip[i]:
+            if arrival[j] is None:
+                one_way = (latency[i] + latency[j]) * rng.uniform(1.0, 1.2)
+                heapq.heappush(heap, (beat + 3 * one_way, j, i, "ihave", beat, one_way))
+    return arrival
+
+
+def heartbeat_after(t):
+    return (int(t / HEARTBEAT) + 1) * HEARTBEAT
+
+
+def log_line(t, content):
+    return f"{START + datetime.timedelta(seconds=t):%Y/%m/%d %H:%M:%S.%f} {content}\n"
+
+
+def node_summary(i, peer, malicious, events, msg_size):
+    # the summary main.go writes with -summary, from the events of the node
+    summary = {
+        "node": i,
+        "peer": peer,
+        "malicious": malicious,
+        "published": {},
+        "delivered": {},
+        "duplicates": {},
+        "control_sent": {},
+        "control_received": {},
+        "rpcs_sent": 0,
+        "rpcs_received": 0,
+        "bytes_sent": 0,
+        "bytes_received": 0,
+    }
+    start = START.replace(tzinfo=datetime.timezone.utc).timestamp()
+    for t, content in sorted(events, key=lambda event: event[0]):
+        ns = int((start + t) * 1e9)
+        id = content.split("id: ")[-1].split(",")[0].rstrip(")")
+        if content.startswith("Published:"):
+            summary["published"].setdefault(id, ns)
+        elif content.startswith("GossipSub: Delivered"):
+            summary["delivered"].setdefault(id, ns)
+        elif content.startswith("GossipSub: Duplicated"):
+            summary["duplicates"][id] = summary["duplicates"].get(id, 0) + 1
+        elif content.startswith("GossipSubRPC: "):
+            action, kind = content.split(" ")[1:3]
+            direction = "sent" if action == "Sent" else "received"
+            if kind == "Publish":
+                summary[f"rpcs_{direction}"] += 1
+                summary[f"bytes_{direction}"] += msg_size
+                continue
+            ids = content.count('"') // 2 if "ids: [" in content else 1
+            control = summary[f"control_{direction}"]
+            control[kind] = control.get(kind, 0) + ids
+    summary["written_at"] = int((start + 290) * 1e9)
+    return summary
+
+
+def generate_logs(
+    folder, count, num_msgs, fanout=6, malicious=(), seed=0, d_mesh=8, d_announce=0, summaries=False, msg_size=128 * 1024
+):
+    rng = random.Random(seed)
+    malicious = set(malicious)
+    peers = [peer_id(i) for i in range(count)]
+    msgs = [msg_id(i) for i in range(num_msgs)]
+    mesh = random_mesh(count, d_mesh, rng)
+    # the mesh peers a node announces the messages to instead of sending them
+    announce_to = [set(sorted(mesh[i])[:d_announce]) for i in range(count)]
+    gossip = []
+    for i in range(count):
+        others = [j for j in range(count) if j != i and j not in mesh[i]]
+        gossip.append(rng.sample(others, min(fanout, len(others))))
+    gossiped_by = [[] for _ in range(count)]
+    for i in range(count):
+        for j in gossip[i]:
+            gossiped_by[j].append(i)
+    latency = [rng.uniform(0.01, 0.1) for _ in range(count)]
+    published = [1.0 + 0.001 * m for m in range(num_msgs)]
+    arrivals = [
+        arrival_times(mesh, announce_to, gossip, latency, malicious, published[m], rng)
+        for m in range(num_msgs)
+    ]
+
+    # the message ids every node gossips at every heartbeat
+    heartbeats = [{} for _ in range(count)]
+    for m, arrival in enumerate(arrivals):
+        for i in range(count):
+            if arrival[i] is not None:
+                heartbeats[i].setdefault(heartbeat_after(arrival[i][0]), []).append(msgs[m])
+
+    total = 0
+    for i in range(count):
+        events = []
+
+        def add(t, content):
+            events.append((t, content))
+
+        add(0, f"Count: {count}")
+        add(0, "Target: 35")
+        add(0, f"Hostname: node{i}")
+        add(0, f"NodeId: {i}")
+        add(0, f"PeerId: {peers[i]}")
+        add(0, f"Listening on: [/ip4/11.0.0.{i % 250 + 1}/tcp/9000]")
+        # the nodes join the topic before they connect to their peers
+        add(0.1, f"GossipSub: Joined (topic: {TOPIC})")
+        for j in sorted(mesh[i]) + gossip[i]:
+            add(0.1, f"GossipSub: Peer Added (id: {peers[j]}, protocol: {PROTOCOL})")
+        for j in sorted(mesh[i]):
+            add(0.2 + HEARTBEAT, f"GossipSub: Grafted (topic: {TOPIC}, peer: {peers[j]})")
+
+        for m, arrival in enumerate(arrivals):
+            if arrival[i] is None:
+                continue
+            t, sender, path, started, one_way = arrival[i]
+            id = msgs[m]
+
+            if path == "publish":
+                add(t, f"Published: (topic: {TOPIC}, id: {id})")
+            else:
+                if path == "announce":
+                    add(started + one_way, f"GossipSubRPC: Received IANNOUNCE (topic: {TOPIC}, id: {id}, from: {peers[sender]})")
+                    add(started + one_way + ANNOUNCE_WAIT, f"GossipSubRPC: Sent INEED (id: {id}, to: {peers[sender]})")
+                elif path == "ihave":
+                    add(started + one_way, f'GossipSubRPC: Received IHAVE (topic: {TOPIC}, ids: ["{id}"], from: {peers[sender]})')
+                    add(started + one_way, f'GossipSubRPC: Sent IWANT (ids: ["{id}"], to: {peers[sender]})')
+                add(t, f"GossipSubRPC: Received Publish (topic: {TOPIC}, id: {id}, from: {peers[sender]})")
+                add(t, f"GossipSub: Validate (id: {id}, from: {peers[sender]})")
+                add(t + 0.001, f"GossipSub: Delivered (id: {id}, from: {peers[sender]})")
+                add(t + 0.001, f"Received: (topic: {TOPIC}, id: {id})")
+
+            for j in sorted(mesh[i]):
+                if j == sender:
+                    continue
+                if path != "publish":
+                    add(t + 0.001, f'GossipSubRPC: Sent IDONTWANT (ids: ["{id}"], to: {peers[j]})')
+                # what i sends to j
+                if arrival[j] is None or arrival[j][0] > t:
+                    if j not in announce_to[i]:
+                        add(t + 0.002, f"GossipSubRPC: Sent Publish (topic: {TOPIC}, id: {id}, to: {peers[j]})")
+                    else:
+                        add(t + 0.002, f"GossipSubRPC: Sent IANNOUNCE (topic: {TOPIC}, id: {id}, to: {peers[j]})")
+                if arrival[j] is not None and arrival[j][1] == i and arrival[j][2] == "announce":
+                    _, _, _, started_j, one_way_j = arrival[j]
+                    add(started_j + 2 * one_way_j + ANNOUNCE_WAIT, f"GossipSubRPC: Received INEED (id: {id}, from: {peers[j]})")
+                    add(started_j + 2 * one_way_j + ANNOUNCE_WAIT, f"GossipSubRPC: Sent Publish (topic: {TOPIC}, id: {id}, to: {peers[j]})")
+                # what j sends to i
+                if arrival[j] is None or arrival[j][0] >= t:
+                    continue
+                hop = latency[i] + latency[j]
+                if i not in announce_to[j]:
+                    # j had it first but our IDONTWANT didn't make it in time
+                    dup = arrival[j][0] + hop * rng.uniform(1.0, 1.2)
+                    add(dup, f"GossipSubRPC: Received Publish (topic: {TOPIC}, id: {id}, from: {peers[j]})")
+                    add(dup, f"GossipSub: Duplicated (id: {id}, from: {peers[j]})")
+                else:
+                    add(arrival[j][0] + 0.002 + hop, f"GossipSubRPC: Received IANNOUNCE (topic: {TOPIC}, id: {id}, from: {peers[j]})")
+                    if j in malicious and arrival[j][0] + 0.002 + hop < t:
+                        # we asked j first, but j ignores INEEDs
+                        add(arrival[j][0] + 0.002 + hop + ANNOUNCE_WAIT, f"GossipSubRPC: Sent INEED (id: {id}, to: {peers[j]})")
+
+            # the INEEDs i ignores
+            if i in malicious:
+                for j in sorted(mesh[i]):
+                    if i in announce_to[j] or j not in announce_to[i] or arrival[j] is None:
+                        continue
+                    hop = latency[i] + latency[j]
+                    if t + 0.002 + hop < arrival[j][0]:
+                        add(t + 0.002 + 2 * hop + ANNOUNCE_WAIT, f"GossipSubRPC: Received INEED (id: {id}, from: {peers[j]})")
+
+            for j in gossip[i]:
+                if arrival[j] is not None and arrival[j][1] == i and arrival[j][2] == "ihave":
+                    _, _, _, started_j, one_way_j = arrival[j]
+                    add(started_j + 2 * one_way_j, f'GossipSubRPC: Received IWANT (ids: ["{id}"], from: {peers[j]})')
+                    add(started_j + 2 * one_way_j, f"GossipSubRPC: Sent Publish (topic: {TOPIC}, id: {id}, to: {peers[j]})")
+
+        for beat, ids in sorted(heartbeats[i].items()):
+            quoted = " ".join(f'"{id}"' for id in ids)
+            for j in gossip[i]:
+                add(beat, f"GossipSubRPC: Sent IHAVE (topic: {TOPIC}, ids: [{quoted}], to: {peers[j]})")
+        for j in gossiped_by[i]:
+            for beat, ids in sorted(heartbeats[j].items()):
+                quoted = " ".join(f'"{id}"' for id in ids)
+                add(beat + latency[i] + latency[j], f"GossipSubRPC: Received IHAVE (topic: {TOPIC}, ids: [{quoted}], from: {peers[j]})")
+
+        events.sort(key=lambda event: event[0])
+        path = os.path.join(folder, "hosts", f"node{i}")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "pubsub-shadow.1000.stdout"), "w") as file:
+            file.writelines(log_line(t, content) for t, content in events)
+        if summaries:
+            with open(os.path.join(path, "pubsub-shadow.summary.json"), "w") as file:
+                json.dump(node_summary(i, peers[i], i in malicious, events, msg_size), file)
+        total += len(events)
+
+    return total
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1]
+    count = int(sys.argv[2])
+    num_msgs = int(sys.argv[3])
+    fanout = int(sys.argv[4]) if len(sys.argv) > 4 else 6
+    percent = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    d_announce = int(sys.argv[6]) if len(sys.argv) > 6 else 0
+    malicious = sample_malicious(count, percent, random.Random(0))
+    lines = generate_logs(folder, count, num_msgs, fanout, malicious, d_announce=d_announce)
+    print(f"{lines} lines written")
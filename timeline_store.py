@@ -0,0 +1,444 @@
+# usage: python timeline_store.py [timeline-json] [store-dir]
+#
+# The event store that analyse_logs.py parses the logs into, and its columnar
+# on-disk format.
+#
+# Message, peer and topic strings are interned to small integers and every
+# event kind is a set of typed columns. On disk every scenario is a directory
+# holding one .npy file per (event kind, column) and a small meta.json with the
+# interned strings. The columns can be memory-mapped, so one scenario or one
+# event kind can be loaded without reading the rest of the store.
+#
+#   <store>/<scenario>/meta.json
+#   <store>/<scenario>/index.node.npy      (node, msg) pairs in the order the
+#   <store>/<scenario>/index.msg.npy       messages were first seen by a node
+#   <store>/<scenario>/<kind>.time.npy     float64 unix timestamps
+#   <store>/<scenario>/<kind>.node.npy     int32 index into meta["nodes"]
+#   <store>/<scenario>/<kind>.msg.npy      int32 index into meta["msgs"], -1 if none
+#   <store>/<scenario>/<kind>.peer.npy     int32 index into meta["peers"], -1 if none
+#   <store>/<scenario>/<kind>.topic.npy    int32 index into meta["topics"], -1 if none
+#
+# Every scenario also has two indexes of all its events, so that the events of
+# one message or of one link can be read without loading the scenario. The
+# events of a message are in shard <msg % INDEX_SHARDS>, sorted by message and
+# time, and msgs.bounds.npy has where every message starts and ends in its
+# shard. The events that name a peer are sorted by node, peer and time in the
+# links index, and nodes.bounds.npy has where every node starts and ends.
+#
+#   <store>/<scenario>/index/shard<i>.<col>.npy  the columns and a "kind" column,
+#   <store>/<scenario>/index/links.<col>.npy     int8 index into EVENT_FIELDS
+#   <store>/<scenario>/index/msgs.bounds.npy
+#   <store>/<scenario>/index/nodes.bounds.npy
+import os
+import sys
+import json
+import array
+import numpy as np
+
+FORMAT_VERSION = 3
+
+COLUMNS = ["time", "node", "msg", "peer", "topic"]
+COLUMN_TYPES = {
+    "time": np.float64,
+    "node": np.int32,
+    "msg": np.int32,
+    "peer": np.int32,
+    "topic": np.int32,
+}
+ARRAY_CODES = {np.float64: "d", np.int32: "i"}
+
+STRING_TABLES = {"msg": "msgs", "peer": "peers", "topic": "topics"}
+
+INDEX_SHARDS = 16
+INDEX_COLUMNS = COLUMNS + ["kind"]
+
+# the fields of an entry in the nested timelines, in tuple order. The kinds
+# that only have a time are bare timestamps in the timelines.
+NODE_EVENT_FIELDS = {
+    "identity": ("time", "peer"),
+    "added": ("time", "peer"),
+    "removed": ("time", "peer"),
+    "throttled": ("time", "peer"),
+    "joined": ("time", "topic"),
+    "left": ("time", "topic"),
+    "grafted": ("time", "topic", "peer"),
+    "pruned": ("time", "topic", "peer"),
+}
+
+MSG_EVENT_FIELDS = {
+    "validated": ("time",),
+    "delivered": ("time",),
+    "rejected": ("time",),
+    "received": ("time", "topic"),
+    "published": ("time", "topic"),
+    "duplicate": ("time",),
+    "undelivered": ("time",),
+    "idontwants_sent": ("time", "topic"),
+    "idontwants_received": ("time", "topic"),
+    "ihaves_sent": ("time", "topic"),
+    "ihaves_received": ("time", "topic"),
+    "iwants_sent": ("time", "topic"),
+    "iwants_received": ("time", "topic"),
+    "iannounces_sent": ("time", "topic"),
+    "iannounces_received": ("time", "topic"),
+    "ineeds_sent": ("time",),
+    "ineeds_received": ("time",),
+    "rpcs_sent": ("time", "topic"),
+    "rpcs_received": ("time", "topic"),
+}
+
+EVENT_FIELDS = {**NODE_EVENT_FIELDS, **MSG_EVENT_FIELDS}
+
+
+def _new_column(col):
+    return array.array(ARRAY_CODES[COLUMN_TYPES[col]])
+
+
+class EventStore:
+    # All the events of one scenario. While parsing, the columns are growable
+    # typed arrays, a loaded store has (memory-mapped) NumPy arrays instead.
+    # The peer column is filled for every event that names a peer, even when
+    # the nested timelines of the kind do not show it.
+
+    def __init__(self):
+        self.nodes = []
+        self.strings = {table: [] for table in STRING_TABLES.values()}
+        self._ids = {table: {} for table in STRING_TABLES.values()}
+        self.index = {"node": _new_column("node"), "msg": _new_column("msg")}
+        self.events = {
+            kind: {col: _new_column(col) for col in COLUMNS} for kind in EVENT_FIELDS
+        }
+
+    def intern(self, table, value):
+        ids = self._ids[table]
+        id = ids.get(value)
+        if id is None:
+            id = ids[value] = len(self.strings[table])
+            self.strings[table].append(value)
+        return id
+
+    def ids(self, table):
+        # the id of every interned string of a table, to look strings up
+        # without a call per lookup. It must not be changed, see intern.
+        return self._ids[table]
+
+    def add_node(self, node_id):
+        self.nodes.append(node_id)
+        return len(self.nodes) - 1
+
+    def column(self, kind, col):
+        values = self.events[kind][col]
+        if isinstance(values, array.array):
+            return np.frombuffer(values, dtype=COLUMN_TYPES[col])
+        return values
+
+    def index_column(self, col):
+        values = self.index[col]
+        if isinstance(values, array.array):
+            return np.frombuffer(values, dtype=COLUMN_TYPES[col])
+        return values
+
+    def extend(self, other):
+        # appends the nodes of another store, e.g. one parsed by a worker
+        # process, remapping its interned strings to the ones of this store
+        node_map = np.array(
+            [self.add_node(node_id) for node_id in other.nodes], dtype=np.int32
+        )
+        maps = {"node": node_map}
+        for col, table in STRING_TABLES.items():
+            # the trailing -1 keeps the missing values at -1
+            maps[col] = np.array(
+                [self.intern(table, value) for value in other.strings[table]] + [-1],
+                dtype=np.int32,
+            )
+
+        for col in ["node", "msg"]:
+            self.index[col].frombytes(maps[col][other.index_column(col)].tobytes())
+        for kind, cols in self.events.items():
+            for col in COLUMNS:
+                values = other.column(kind, col)
+                if col in maps:
+                    values = maps[col][values]
+                cols[col].frombytes(np.ascontiguousarray(values).tobytes())
+
+    def node_timeline(self, node_id):
+        return self.to_timelines([node_id])[node_id]
+
+    def to_timelines(self, node_ids=None):
+        # the nested dict of lists that read_node_logs used to return for
+        # every node
+        nodes = self.nodes
+        msgs = self.strings["msgs"]
+        tables = {"peer": self.strings["peers"], "topic": self.strings["topics"]}
+        if node_ids is None:
+            node_ids = nodes
+        rows = {node_id: row for row, node_id in enumerate(nodes)}
+        wanted = np.zeros(len(nodes), dtype=bool)
+        wanted[[rows[node_id] for node_id in node_ids]] = True
+
+        extracted_data = {}
+        for node_id in node_ids:
+            extracted_data[node_id] = {kind: [] for kind in NODE_EVENT_FIELDS}
+            extracted_data[node_id]["msgs"] = {}
+
+        index_node = self.index_column("node")
+        rows = np.flatnonzero(wanted[index_node])
+        for node, msg in zip(
+            index_node[rows].tolist(), self.index_column("msg")[rows].tolist()
+        ):
+            extracted_data[nodes[node]]["msgs"][msgs[msg]] = {
+                kind: [] for kind in MSG_EVENT_FIELDS
+            }
+
+        for kind, fields in EVENT_FIELDS.items():
+            rows = np.flatnonzero(wanted[self.column(kind, "node")])
+            values = []
+            for field in fields:
+                column = self.column(kind, field)[rows].tolist()
+                if field in tables:
+                    column = [tables[field][i] for i in column]
+                values.append(column)
+            entries = values[0] if len(fields) == 1 else list(zip(*values))
+
+            node_col = self.column(kind, "node")[rows].tolist()
+            msg_col = self.column(kind, "msg")[rows].tolist()
+            for node, msg, entry in zip(node_col, msg_col, entries):
+                timeline = extracted_data[nodes[node]]
+                if msg < 0:
+                    timeline[kind].append(entry)
+                else:
+                    timeline["msgs"][msgs[msg]][kind].append(entry)
+
+        return extracted_data
+
+    @classmethod
+    def from_timelines(cls, extracted_data):
+        store = cls()
+        for node_id, timeline in extracted_data.items():
+            node = store.add_node(node_id)
+            for kind in NODE_EVENT_FIELDS:
+                # timelines from older versions may lack some kinds
+                for entry in timeline.get(kind, []):
+                    store._add_entry(kind, node, -1, entry)
+            for msg_id, events in timeline["msgs"].items():
+                msg = store.intern("msgs", msg_id)
+                store.index["node"].append(node)
+                store.index["msg"].append(msg)
+                for kind in MSG_EVENT_FIELDS:
+                    for entry in events[kind]:
+                        store._add_entry(kind, node, msg, entry)
+        return store
+
+    def _add_entry(self, kind, node, msg, entry):
+        fields = EVENT_FIELDS[kind]
+        if len(fields) == 1:
+            entry = (entry,)
+        values = dict(zip(fields, entry))
+        cols = self.events[kind]
+        cols["time"].append(values["time"])
+        cols["node"].append(node)
+        cols["msg"].append(msg)
+        for col, table in [("peer", "peers"), ("topic", "topics")]:
+            cols[col].append(self.intern(table, values[col]) if col in values else -1)
+
+
+def write_scenario(path, store, fingerprint=None):
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        os.remove(os.path.join(path, "meta.json"))
+
+    for col in ["node", "msg"]:
+        np.save(os.path.join(path, f"index.{col}.npy"), store.index_column(col))
+    for kind in EVENT_FIELDS:
+        for col in COLUMNS:
+            np.save(os.path.join(path, f"{kind}.{col}.npy"), store.column(kind, col))
+    write_indexes(os.path.join(path, "index"), store)
+
+    # meta.json is written last so that a scenario without it is incomplete
+    meta = {
+        "version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "nodes": store.nodes,
+        **store.strings,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def write_indexes(path, store):
+    os.makedirs(path, exist_ok=True)
+    kinds = list(EVENT_FIELDS)
+    events = {
+        col: np.concatenate([store.column(kind, col) for kind in kinds])
+        for col in COLUMNS
+    }
+    events["kind"] = np.concatenate(
+        [
+            np.full(len(store.column(kind, "time")), i, dtype=np.int8)
+            for i, kind in enumerate(kinds)
+        ]
+    )
+
+    def save(name, rows):
+        for col in INDEX_COLUMNS:
+            np.save(os.path.join(path, f"{name}.{col}.npy"), events[col][rows])
+
+    rows = np.flatnonzero(events["msg"] >= 0)
+    rows = rows[np.lexsort((events["time"][rows], events["msg"][rows]))]
+    n_msgs = len(store.strings["msgs"])
+    bounds = np.zeros((n_msgs, 2), dtype=np.int64)
+    for shard in range(INDEX_SHARDS):
+        shard_rows = rows[events["msg"][rows] % INDEX_SHARDS == shard]
+        save(f"shard{shard}", shard_rows)
+        msgs = np.arange(shard, n_msgs, INDEX_SHARDS)
+        bounds[msgs, 0] = np.searchsorted(events["msg"][shard_rows], msgs, side="left")
+        bounds[msgs, 1] = np.searchsorted(events["msg"][shard_rows], msgs, side="right")
+    np.save(os.path.join(path, "msgs.bounds.npy"), bounds)
+
+    rows = np.flatnonzero(events["peer"] >= 0)
+    rows = rows[
+        np.lexsort((events["time"][rows], events["peer"][rows], events["node"][rows]))
+    ]
+    save("links", rows)
+    nodes = np.arange(len(store.nodes))
+    bounds = np.stack(
+        [
+            np.searchsorted(events["node"][rows], nodes, side="left"),
+            np.searchsorted(events["node"][rows], nodes, side="right"),
+        ],
+        axis=1,
+    )
+    np.save(os.path.join(path, "nodes.bounds.npy"), bounds)
+
+
+def _index_rows(path, name, start, end):
+    # the columns of rows [start, end) of an index, read through mmap
+    return {
+        col: np.load(os.path.join(path, f"{name}.{col}.npy"), mmap_mode="r")[start:end]
+        for col in INDEX_COLUMNS
+    }
+
+
+def _sorted_by_time(parts):
+    events = {
+        col: np.concatenate([part[col] for part in parts]) for col in INDEX_COLUMNS
+    }
+    order = np.argsort(events["time"], kind="stable")
+    return {col: values[order] for col, values in events.items()}
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if meta["version"] != FORMAT_VERSION:
+        raise Exception(f"unsupported timeline store version in {path}")
+    return meta
+
+
+def query_msg(path, msg):
+    # every event of a message (its index in meta["msgs"]) in a scenario,
+    # sorted by time
+    index = os.path.join(path, "index")
+    start, end = np.load(os.path.join(index, "msgs.bounds.npy"), mmap_mode="r")[msg]
+    return _index_rows(index, f"shard{msg % INDEX_SHARDS}", start, end)
+
+
+def query_link(path, node, other):
+    # every event of node about the peer of other and of other about the peer
+    # of node, sorted by time. The peers of the nodes are the ones of their
+    # identity events.
+    index = os.path.join(path, "index")
+    bounds = np.load(os.path.join(index, "nodes.bounds.npy"), mmap_mode="r")
+    peer_of = {
+        int(n): int(p)
+        for n, p in zip(
+            np.load(os.path.join(path, "identity.node.npy")),
+            np.load(os.path.join(path, "identity.peer.npy")),
+        )
+    }
+    parts = []
+    for a, b in [(node, other), (other, node)]:
+        if b not in peer_of:
+            continue
+        start, end = bounds[a]
+        peers = np.load(os.path.join(index, "links.peer.npy"), mmap_mode="r")[start:end]
+        lo = start + np.searchsorted(peers, peer_of[b], side="left")
+        hi = start + np.searchsorted(peers, peer_of[b], side="right")
+        parts.append(_index_rows(index, "links", lo, hi))
+    if not parts:
+        return _index_rows(index, "links", 0, 0)
+    return _sorted_by_time(parts)
+
+
+def scenario_fingerprint(path):
+    # the fingerprint of the logs the scenario was parsed from, None if the
+    # scenario isn't in the store or was written by another version
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta["version"] != FORMAT_VERSION:
+        return None
+    return meta["fingerprint"]
+
+
+def load_scenario(path, kinds=None, mmap=True):
+    meta = read_meta(path)
+
+    mmap_mode = "r" if mmap else None
+    if kinds is None:
+        kinds = list(EVENT_FIELDS)
+
+    store = EventStore()
+    store.nodes = meta["nodes"]
+    for table in STRING_TABLES.values():
+        store.strings[table] = meta[table]
+        store._ids[table] = {value: id for id, value in enumerate(meta[table])}
+
+    for col in ["node", "msg"]:
+        store.index[col] = np.load(
+            os.path.join(path, f"index.{col}.npy"), mmap_mode=mmap_mode
+        )
+    for kind in EVENT_FIELDS:
+        for col in COLUMNS:
+            column_path = os.path.join(path, f"{kind}.{col}.npy")
+            if kind in kinds and os.path.exists(column_path):
+                store.events[kind][col] = np.load(column_path, mmap_mode=mmap_mode)
+            else:
+                # the kinds that were not asked for, or that the store was
+                # written without, look empty
+                store.events[kind][col] = np.empty(0, dtype=COLUMN_TYPES[col])
+
+    return store
+
+
+def write_store(root, timelines):
+    for key, store in timelines.items():
+        if not isinstance(store, EventStore):
+            store = EventStore.from_timelines(store)
+        write_scenario(os.path.join(root, key), store)
+
+
+def store_keys(root):
+    return sorted(
+        key
+        for key in os.listdir(root)
+        if os.path.exists(os.path.join(root, key, "meta.json"))
+    )
+
+
+def load_store(root, keys=None):
+    if keys is None:
+        keys = store_keys(root)
+    return {key: load_scenario(os.path.join(root, key)) for key in keys}
+
+
+def convert_json(json_path, root):
+    with open(json_path, "r") as f:
+        timelines = json.load(f)
+    write_store(root, timelines)
+
+
+if __name__ == "__main__":
+    convert_json(sys.argv[1], sys.argv[2])
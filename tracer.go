@@ -1,9 +1,16 @@
 package main
 
 import (
+	"bufio"
 	"crypto/sha256"
 	"encoding/base64"
+	"encoding/json"
 	"fmt"
+	"io"
+	"os"
+	"strconv"
+	"sync"
+	"time"
 
 	pubsub "github.com/libp2p/go-libp2p-pubsub"
 	pb "github.com/libp2p/go-libp2p-pubsub/pb"
@@ -15,7 +22,198 @@ import (
 type gossipTracer struct{}
 type eventTracer struct{}
 
+// the verbosity levels of the tracing. The peer, mesh and message events are
+// always traced.
+const (
+	// only the message events, e.g. deliveries and duplicates
+	traceMessages = iota
+	// and the published messages sent, received and dropped in RPCs
+	traceDataRPCs
+	// and the control messages (IHAVE, IWANT, IDONTWANT, IANNOUNCE, INEED)
+	traceControlRPCs
+)
+
+var traceVerbosity = traceControlRPCs
+
+// asyncWriter queues the writes in a bounded channel and writes them in
+// batches from a goroutine, so that tracing doesn't make the nodes wait for
+// write syscalls. A full queue blocks the writers rather than dropping lines.
+type asyncWriter struct {
+	queue chan []byte
+	flush chan chan struct{}
+}
+
+func newAsyncWriter(w io.Writer, queueSize int, flushInterval time.Duration) *asyncWriter {
+	a := &asyncWriter{queue: make(chan []byte, queueSize), flush: make(chan chan struct{})}
+	go a.run(bufio.NewWriterSize(w, 1<<20), flushInterval)
+	return a
+}
+
+// Write queues a copy of p, so the caller can reuse it. The time of a log
+// line is the time it is queued.
+func (a *asyncWriter) Write(p []byte) (int, error) {
+	a.queue <- append([]byte(nil), p...)
+	return len(p), nil
+}
+
+// Flush writes everything queued before it out, and returns once it is
+// written.
+func (a *asyncWriter) Flush() {
+	done := make(chan struct{})
+	a.flush <- done
+	<-done
+}
+
+func (a *asyncWriter) run(out *bufio.Writer, flushInterval time.Duration) {
+	// the buffer is flushed periodically, and on exit by Flush, so that a
+	// node that is killed loses at most the last flushInterval
+	ticker := time.NewTicker(flushInterval)
+	for {
+		select {
+		case p := <-a.queue:
+			out.Write(p)
+		case <-ticker.C:
+			out.Flush()
+		case done := <-a.flush:
+			for len(a.queue) > 0 {
+				out.Write(<-a.queue)
+			}
+			out.Flush()
+			close(done)
+		}
+	}
+}
+
+// structuredTrace is set when the events are written as JSONL records
+// instead of being logged as text.
+var structuredTrace *traceWriter
+
+// traceWriter writes one JSON array per line. An event is
+//
+//	[unix-nanos, event, peer, msg, topic]
+//
+// where event is the name of the timeline it belongs to in analyse_logs.py
+// and peer, msg and topic are indices into interned tables, or -1 if the
+// event has none. The first time a value is seen, a definition record
+//
+//	["peer"|"msg"|"topic", index, value]
+//
+// is written before the event that uses it.
+type traceWriter struct {
+	mu     sync.Mutex
+	out    *asyncWriter
+	buf    []byte
+	tables map[string]map[string]int
+}
+
+func newTraceWriter(path string, flushInterval time.Duration) (*traceWriter, error) {
+	f, err := os.Create(path)
+	if err != nil {
+		return nil, err
+	}
+	t := &traceWriter{
+		out: newAsyncWriter(f, 1<<16, flushInterval),
+		tables: map[string]map[string]int{
+			"peer":  make(map[string]int),
+			"msg":   make(map[string]int),
+			"topic": make(map[string]int),
+		},
+	}
+	return t, nil
+}
+
+// intern returns the index of key in the table. value is only called the
+// first time the key is seen. The caller must hold t.mu.
+func (t *traceWriter) intern(table string, key string, value func() string) int {
+	if key == "" {
+		return -1
+	}
+	ids := t.tables[table]
+	if id, ok := ids[key]; ok {
+		return id
+	}
+	id := len(ids)
+	ids[key] = id
+
+	encoded, _ := json.Marshal(value())
+	t.buf = append(t.buf[:0], '[', '"')
+	t.buf = append(t.buf, table...)
+	t.buf = append(t.buf, '"', ',')
+	t.buf = strconv.AppendInt(t.buf, int64(id), 10)
+	t.buf = append(t.buf, ',')
+	t.buf = append(t.buf, encoded...)
+	t.buf = append(t.buf, ']', '\n')
+	t.out.Write(t.buf)
+	return id
+}
+
+func (t *traceWriter) event(event string, p peer.ID, msgID string, topic string) {
+	now := time.Now().UnixNano()
+
+	t.mu.Lock()
+	defer t.mu.Unlock()
+
+	peerIdx := t.intern("peer", string(p), p.String)
+	msgIdx := t.intern("msg", msgID, func() string { return msgID })
+	topicIdx := t.intern("topic", topic, func() string { return topic })
+
+	t.buf = append(t.buf[:0], '[')
+	t.buf = strconv.AppendInt(t.buf, now, 10)
+	t.buf = append(t.buf, ',', '"')
+	t.buf = append(t.buf, event...)
+	t.buf = append(t.buf, '"', ',')
+	t.buf = strconv.AppendInt(t.buf, int64(peerIdx), 10)
+	t.buf = append(t.buf, ',')
+	t.buf = strconv.AppendInt(t.buf, int64(msgIdx), 10)
+	t.buf = append(t.buf, ',')
+	t.buf = strconv.AppendInt(t.buf, int64(topicIdx), 10)
+	t.buf = append(t.buf, ']', '\n')
+	t.out.Write(t.buf)
+}
+
+// traceRpcEvt writes the same events as logRpcEvt to the structured trace.
+func (t eventTracer) traceRpcEvt(suffix string, data *pb.TraceEvent_RPCMeta, p peer.ID) {
+	for _, msg := range data.GetMessages() {
+		structuredTrace.event("rpcs_"+suffix, p, msg.GetMessageID(), msg.GetTopic())
+	}
+	if traceVerbosity < traceControlRPCs {
+		return
+	}
+
+	controlData := data.GetControl()
+
+	for _, msg := range controlData.GetIhave() {
+		for _, id := range msg.GetMessageIDs() {
+			structuredTrace.event("ihaves_"+suffix, p, id, msg.GetTopic())
+		}
+	}
+	for _, msg := range controlData.GetIwant() {
+		for _, id := range msg.GetMessageIDs() {
+			structuredTrace.event("iwants_"+suffix, p, id, "")
+		}
+	}
+	for _, msg := range controlData.GetIdontwant() {
+		for _, id := range msg.GetMessageIDs() {
+			structuredTrace.event("idontwants_"+suffix, p, id, "")
+		}
+	}
+	for _, msg := range controlData.GetIannounce() {
+		structuredTrace.event("iannounces_"+suffix, p, msg.GetMessageID(), msg.GetTopic())
+	}
+	for _, msg := range controlData.GetIneed() {
+		structuredTrace.event("ineeds_"+suffix, p, msg.GetMessageID(), "")
+	}
+}
+
 func (t eventTracer) logRpcEvt(action string, data *pb.TraceEvent_RPCMeta, suffix string) {
+	for _, msg := range data.GetMessages() {
+		log.Printf("GossipSubRPC: %s Publish (topic: %s, id: %s%s)\n",
+			action, msg.GetTopic(), msg.GetMessageID(), suffix)
+	}
+	if traceVerbosity < traceControlRPCs {
+		return
+	}
+
 	controlData := data.GetControl()
 
 	if len(controlData.GetIhave()) > 0 {
@@ -48,18 +246,27 @@ func (t eventTracer) logRpcEvt(action string, data *pb.TraceEvent_RPCMeta, suffi
 				action, msg.GetMessageID(), suffix)
 		}
 	}
-
-	for _, msg := range data.GetMessages() {
-		log.Printf("GossipSubRPC: %s Publish (topic: %s, id: %s%s)\n",
-			action, msg.GetTopic(), msg.GetMessageID(), suffix)
-	}
 }
 
 func (t eventTracer) Trace(evt *pb.TraceEvent) {
+	if summary != nil {
+		if evt.GetType() == pb.TraceEvent_RECV_RPC {
+			summary.rpc(false, evt.GetRecvRPC().GetMeta())
+		} else if evt.GetType() == pb.TraceEvent_SEND_RPC {
+			summary.rpc(true, evt.GetSendRPC().GetMeta())
+		}
+	}
+	if traceVerbosity < traceDataRPCs {
+		return
+	}
 
 	if evt.GetType() == pb.TraceEvent_RECV_RPC {
 		// we only log control messages here
 		from, err := peer.IDFromBytes(evt.GetRecvRPC().GetReceivedFrom())
+		if structuredTrace != nil {
+			t.traceRpcEvt("received", evt.GetRecvRPC().GetMeta(), from)
+			return
+		}
 		if err != nil {
 			t.logRpcEvt("Received", evt.GetRecvRPC().GetMeta(), "")
 		}
@@ -68,6 +275,10 @@ func (t eventTracer) Trace(evt *pb.TraceEvent) {
 	} else if evt.GetType() == pb.TraceEvent_SEND_RPC {
 		// we only log control messages here
 		to, err := peer.IDFromBytes(evt.GetSendRPC().GetSendTo())
+		if structuredTrace != nil {
+			t.traceRpcEvt("sent", evt.GetSendRPC().GetMeta(), to)
+			return
+		}
 		if err != nil {
 			t.logRpcEvt("Sent", evt.GetSendRPC().GetMeta(), "")
 		}
@@ -85,61 +296,115 @@ func CalcID(msg []byte) string {
 
 // AddPeer .
 func (g gossipTracer) AddPeer(p peer.ID, proto protocol.ID) {
+	if structuredTrace != nil {
+		structuredTrace.event("added", p, "", "")
+		return
+	}
 	log.Printf("GossipSub: Peer Added (id: %s, protocol: %s)\n", p.String(), string(proto))
 }
 
 // RemovePeer .
 func (g gossipTracer) RemovePeer(p peer.ID) {
+	if structuredTrace != nil {
+		structuredTrace.event("removed", p, "", "")
+		return
+	}
 	log.Printf("GossipSub: Peer Removed (id: %s)\n", p.String())
 }
 
 // Join .
 func (g gossipTracer) Join(topic string) {
+	if structuredTrace != nil {
+		structuredTrace.event("joined", "", "", topic)
+		return
+	}
 	log.Printf("GossipSub: Joined (topic: %s)\n", topic)
 }
 
 // Leave .
 func (g gossipTracer) Leave(topic string) {
+	if structuredTrace != nil {
+		structuredTrace.event("left", "", "", topic)
+		return
+	}
 	log.Printf("GossipSub: Left (topic: %s)\n", topic)
 }
 
 // Graft .
 func (g gossipTracer) Graft(p peer.ID, topic string) {
+	if structuredTrace != nil {
+		structuredTrace.event("grafted", p, "", topic)
+		return
+	}
 	log.Printf("GossipSub: Grafted (topic: %s, peer: %s)\n", topic, p.String())
 }
 
 // Prune .
 func (g gossipTracer) Prune(p peer.ID, topic string) {
+	if structuredTrace != nil {
+		structuredTrace.event("pruned", p, "", topic)
+		return
+	}
 	log.Printf("GossipSub: Pruned (topic: %s, peer: %s)\n", topic, p.String())
 }
 
 // ValidateMessage .
 func (g gossipTracer) ValidateMessage(msg *pubsub.Message) {
+	if structuredTrace != nil {
+		structuredTrace.event("validated", msg.ReceivedFrom, msg.ID, "")
+		return
+	}
 	log.Printf("GossipSub: Validate (id: %s, from: %s)\n", msg.ID, msg.ReceivedFrom.String())
 }
 
 // DeliverMessage .
 func (g gossipTracer) DeliverMessage(msg *pubsub.Message) {
+	if summary != nil {
+		summary.delivered(msg.ID)
+	}
+	if structuredTrace != nil {
+		structuredTrace.event("delivered", msg.ReceivedFrom, msg.ID, "")
+		return
+	}
 	log.Printf("GossipSub: Delivered (id: %s, from: %s)\n", msg.ID, msg.ReceivedFrom.String())
 }
 
 // RejectMessage .
 func (g gossipTracer) RejectMessage(msg *pubsub.Message, reason string) {
+	if structuredTrace != nil {
+		structuredTrace.event("rejected", msg.ReceivedFrom, msg.ID, "")
+		return
+	}
 	log.Printf("GossipSub: Rejected (id: %s, from: %s, reason: %s)\n", msg.ID, msg.ReceivedFrom.String(), reason)
 }
 
 // DuplicateMessage .
 func (g gossipTracer) DuplicateMessage(msg *pubsub.Message) {
+	if summary != nil {
+		summary.duplicate(msg.ID)
+	}
+	if structuredTrace != nil {
+		structuredTrace.event("duplicate", msg.ReceivedFrom, msg.ID, "")
+		return
+	}
 	log.Printf("GossipSub: Duplicated (id: %s, from: %s)\n", msg.ID, msg.ReceivedFrom.String())
 }
 
 // UndeliverableMessage .
 func (g gossipTracer) UndeliverableMessage(msg *pubsub.Message) {
+	if structuredTrace != nil {
+		structuredTrace.event("undelivered", msg.ReceivedFrom, msg.ID, "")
+		return
+	}
 	log.Printf("GossipSub: Undeliverable (id: %s, from: %s)\n", msg.ID, msg.ReceivedFrom.String())
 }
 
 // ThrottlePeer .
 func (g gossipTracer) ThrottlePeer(p peer.ID) {
+	if structuredTrace != nil {
+		structuredTrace.event("throttled", p, "", "")
+		return
+	}
 	log.Printf("GossipSub: Throttled (peer: %s)\n", p.String())
 }
 
@@ -154,14 +419,29 @@ func (g gossipTracer) logRPC(rpc *pubsub.RPC, suffix string, action string) {
 
 // RecvRPC .
 func (g gossipTracer) RecvRPC(rpc *pubsub.RPC) {
+	if summary != nil {
+		summary.rpcBytes(false, rpc)
+	}
 }
 
 // SendRPC .
 func (g gossipTracer) SendRPC(rpc *pubsub.RPC, p peer.ID) {
+	if summary != nil {
+		summary.rpcBytes(true, rpc)
+	}
 }
 
 // DropRPC .
 func (g gossipTracer) DropRPC(rpc *pubsub.RPC, p peer.ID) {
+	if traceVerbosity < traceDataRPCs {
+		return
+	}
+	if structuredTrace != nil {
+		for _, msg := range rpc.Publish {
+			structuredTrace.event("rpcs_dropped", p, CalcID(msg.Data), *msg.Topic)
+		}
+		return
+	}
 	suffix := ", to: " + p.String()
 	g.logRPC(rpc, suffix, "Dropped")
 }